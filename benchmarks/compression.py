@@ -0,0 +1,110 @@
+"""
+Measure bytes on the wire and CPU cost of response compression for the record pages.
+
+The database at --dsn is wiped with init-db and seeded with --size records. Each route is
+requested through the Flask test client with Accept-Encoding set to identity, gzip and br
+(when brotli is installed) and the suite reports the median response size, wall time and
+process CPU time per request. The extra CPU over identity is the cost of compression;
+compare it with the bytes saved, e.g. per 100 ms of transfer on the slowest expected link.
+
+Usage:
+    BENCH_DATABASE_URI=postgresql://localhost/uid_bench python benchmarks/compression.py
+    python benchmarks/compression.py --size 100000 --gzip-level 9 --brotli-quality 6
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes import EMPTY_FILTERS, HTMX_HEADERS, seed_records
+
+ENCODINGS = ("identity", "gzip", "br")
+
+
+def build_routes():
+    """Returns (name, request callable) for each benchmarked route."""
+    return [
+        ("GET /record/", lambda c, headers: c.get("/record/", headers=headers)),
+        ("GET /record/filter", lambda c, headers: c.get(
+            "/record/filter", query_string=EMPTY_FILTERS, headers={**HTMX_HEADERS, **headers}
+        )),
+        ("GET /record/download-table-csv", lambda c, headers: c.get("/record/download-table-csv", headers=headers)),
+    ]
+
+
+def measure(client, request, encoding, iterations):
+    """Returns the response size, median wall and CPU milliseconds for one encoding."""
+    headers = {"Accept-Encoding": encoding}
+    request(client, headers).get_data()  # warm caches, pool and template compilation
+
+    walls, cpus, size, applied = [], [], 0, None
+    for _ in range(iterations):
+        wall, cpu = time.perf_counter(), time.process_time()
+        response = request(client, headers)
+        size = len(response.get_data())
+        cpus.append((time.process_time() - cpu) * 1000)
+        walls.append((time.perf_counter() - wall) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        applied = response.headers.get("Content-Encoding", "identity")
+    return {
+        "bytes": size,
+        "encoding": applied,
+        "wall_ms": statistics.median(walls),
+        "cpu_ms": statistics.median(cpus),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URI"), help="benchmark database (is wiped)")
+    parser.add_argument("--size", type=int, default=10000, help="records in the table")
+    parser.add_argument("--iterations", type=int, default=30, help="requests per route and encoding")
+    parser.add_argument("--gzip-level", type=int, default=6, help="COMPRESSION_GZIP_LEVEL")
+    parser.add_argument("--brotli-quality", type=int, default=4, help="COMPRESSION_BROTLI_QUALITY")
+    parser.add_argument("--min-size", type=int, default=1024, help="COMPRESSION_MIN_SIZE")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("set --dsn or BENCH_DATABASE_URI to a database that may be wiped")
+
+    os.environ["FLASK_ENV"] = "development"
+    os.environ["DEV_DATABASE_URI"] = args.dsn
+    os.environ["COMPRESSION_ENABLED"] = "true"
+    os.environ["COMPRESSION_GZIP_LEVEL"] = str(args.gzip_level)
+    os.environ["COMPRESSION_BROTLI_QUALITY"] = str(args.brotli_quality)
+    os.environ["COMPRESSION_MIN_SIZE"] = str(args.min_size)
+
+    from app import create_app
+    from app.compression import brotli
+    from app.db import init_db
+
+    app = create_app()
+    app.config.update(SECRET_KEY=app.config.get("SECRET_KEY") or "benchmark", SESSION_COOKIE_SECURE=False)
+    with app.app_context():
+        init_db()
+    seed_records(app, args.size)
+
+    client = app.test_client()
+    client.post("/auth/login", data={"email": "test123@gmail.com", "password": "asdf"})
+
+    encodings = [encoding for encoding in ENCODINGS if encoding != "br" or brotli is not None]
+    if brotli is None:
+        print("brotli is not installed; only identity and gzip are measured")
+
+    print(f"{args.size} records")
+    print(f"{'route':<32} {'encoding':>9} {'bytes':>10} {'ratio':>6} {'wall ms':>8} {'cpu ms':>8} {'+cpu ms':>8}")
+    for name, request in build_routes():
+        baseline = None
+        for encoding in encodings:
+            stats = measure(client, request, encoding, args.iterations)
+            baseline = baseline or stats
+            print(f"{name:<32} {stats['encoding']:>9} {stats['bytes']:>10} "
+                  f"{baseline['bytes'] / max(stats['bytes'], 1):>6.1f} {stats['wall_ms']:>8.2f} "
+                  f"{stats['cpu_ms']:>8.2f} {stats['cpu_ms'] - baseline['cpu_ms']:>+8.2f}")
+
+
+if __name__ == "__main__":
+    main()
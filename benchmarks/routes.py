@@ -0,0 +1,251 @@
+"""
+Route-level benchmarks for the record pages, run against a local Postgres database.
+
+The database at --dsn is wiped with init-db, seeded with synthetic records at each requested
+size, and the real routes are driven through the Flask test client. For every route the
+suite reports p50/p95 latency, queries and pool checkouts per request and peak Python memory. --save-baseline
+writes the results to --baseline. Later runs compare against that file and exit non-zero
+when a route slows down by more than --threshold.
+
+Usage:
+    BENCH_DATABASE_URI=postgresql://localhost/uid_bench python benchmarks/routes.py
+    python benchmarks/routes.py --sizes 10000,100000 --iterations 30 --save-baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import psycopg2.extras
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+HTMX_HEADERS = {"HX-Request": "true"}
+EMPTY_FILTERS = {
+    "record-name": "",
+    "from-date": "",
+    "to-date": "",
+    "email": "",
+    "data-location-type": "",
+    "invenio": "",
+    "project": "",
+    "uid": "",
+    "search": "",
+}
+
+
+class CountingCursor(psycopg2.extras.DictCursor):
+    """DictCursor that counts the statements it sends."""
+
+    statements = 0
+
+    def execute(self, query, vars=None):
+        CountingCursor.statements += 1
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        CountingCursor.statements += 1
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        CountingCursor.statements += 1
+        return super().copy_expert(sql, file, size)
+
+
+def seed_records(app, total):
+    """Grows the record table to total rows with allocate_uid generated UIDs."""
+    from app.db import get_db
+
+    with app.app_context():
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("SELECT COUNT(*) FROM record")
+        start = cursor.fetchone()[0] + 1
+        if start > total:
+            return
+        cursor.execute(
+            """
+            INSERT INTO record (creator_id, project_id_1, project_id_2, created, record_name,
+                                record_description, data_location_type, data_location, invenio, uid)
+            SELECT 1 + i % 2, p1, p2, created, 'bench-record-' || i,
+                   'Shoreline survey ' || i || ' compiled for benchmark run',
+                   (ARRAY ['local', 'coastal6', 'other'])[1 + i % 3],
+                   '/data/bench/' || (i % 97) || '/record-' || i || '.tif',
+                   i % 2 = 0,
+                   allocate_uid(p1, p2, created)
+            FROM (SELECT i, 1 + i % 3 AS p1, CASE WHEN i % 4 = 0 THEN 2 ELSE 0 END AS p2,
+                         TIMESTAMP '2023-08-08' + i * INTERVAL '37 seconds' AS created
+                  FROM generate_series(%s, %s) AS i) AS rows
+            """,
+            (start, total),
+        )
+        db.commit()
+        cursor.execute("ANALYZE record")
+        db.commit()
+
+
+def fetch_sample(app):
+    """Returns a record in the middle of the table, used for cursors and row fragments."""
+    from app.db import get_db
+
+    with app.app_context():
+        cursor = get_db().cursor()
+        cursor.execute(
+            "SELECT record_id, created, uid FROM record ORDER BY created DESC, record_id DESC"
+            " OFFSET (SELECT COUNT(*) / 2 FROM record) LIMIT 1"
+        )
+        return cursor.fetchone()
+
+
+def build_routes(sample, run):
+    """Returns (name, iterations factor, request callable) for each benchmarked route."""
+    counter = iter(range(10 ** 9))
+
+    def create_form():
+        return {
+            "record-name": f"bench-created-{run}-{next(counter)}",
+            "project1-id": "1",
+            "project2-id": "2",
+            "record-description": "Created by the route benchmark",
+            "data-location-type": "local",
+            "data-location": "/data/bench/created",
+        }
+
+    cursor = {"after-created": sample["created"].isoformat(sep=" "), "after-id": sample["record_id"]}
+    return [
+        ("GET /record/", 1, lambda c: c.get("/record/")),
+        ("POST /record/filter (empty)", 1, lambda c: c.post("/record/filter", data=EMPTY_FILTERS, headers=HTMX_HEADERS)),
+        ("POST /record/filter (next page)", 1,
+         lambda c: c.post("/record/filter", data={**EMPTY_FILTERS, **cursor}, headers=HTMX_HEADERS)),
+        ("POST /record/filter (name)", 1,
+         lambda c: c.post("/record/filter", data={**EMPTY_FILTERS, "record-name": "record-12"}, headers=HTMX_HEADERS)),
+        ("POST /record/filter (uid prefix)", 1,
+         lambda c: c.post("/record/filter", data={**EMPTY_FILTERS, "uid": sample["uid"][:11]}, headers=HTMX_HEADERS)),
+        ("POST /record/filter (search)", 1,
+         lambda c: c.post("/record/filter", data={**EMPTY_FILTERS, "search": "shoreline survey"}, headers=HTMX_HEADERS)),
+        ("GET /record/row/<id>", 1, lambda c: c.get(f"/record/row/{sample['record_id']}", headers=HTMX_HEADERS)),
+        ("POST /record/record_name", 1,
+         lambda c: c.post("/record/record_name", data={"record-name": "bench-record-1"}, headers=HTMX_HEADERS)),
+        ("POST /record/create", 1, lambda c: c.post("/record/create", data=create_form(), headers=HTMX_HEADERS)),
+        ("GET /record/download-table-csv", 0.1, lambda c: c.get("/record/download-table-csv")),
+        ("GET /static/img/loading.svg", 1, lambda c: c.get("/static/img/loading.svg")),
+    ]
+
+
+def measure(client, request, iterations, pool):
+    """Runs a request repeatedly and returns latency percentiles, queries, checkouts and peak memory."""
+    request(client).get_data()  # warm caches, pool and template compilation
+
+    latencies = []
+    CountingCursor.statements = 0
+    checkouts = pool.stats()["checkouts"]
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = request(client)
+        response.get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"HTTP {response.status_code}")
+    queries = CountingCursor.statements / iterations
+    checkouts = (pool.stats()["checkouts"] - checkouts) / iterations
+
+    tracemalloc.start()
+    request(client).get_data()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        "queries": round(queries, 2),
+        "checkouts": round(checkouts, 2),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Prints the change against the baseline and returns the regressed routes."""
+    regressions = []
+    for size, routes in results.items():
+        for route, stats in routes.items():
+            before = baseline.get(size, {}).get(route)
+            if not before or not before["p95_ms"]:
+                continue
+            change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+            flag = " REGRESSION" if change > threshold else ""
+            print(f"{size:>9} {route:<36} p95 {before['p95_ms']:>9.2f} -> {stats['p95_ms']:>9.2f} ms "
+                  f"({change:+.0%}){flag}")
+            if flag:
+                regressions.append((size, route))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URI"), help="benchmark database (is wiped)")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma separated record counts")
+    parser.add_argument("--iterations", type=int, default=50, help="requests per route and size")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 slowdown before failing")
+    parser.add_argument("--no-prepared-statements", action="store_true",
+                        help="send full query text instead of prepared statements, for comparison")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("set --dsn or BENCH_DATABASE_URI to a database that may be wiped")
+
+    os.environ["FLASK_ENV"] = "development"
+    os.environ["DEV_DATABASE_URI"] = args.dsn
+    if args.no_prepared_statements:
+        os.environ["DB_PREPARED_STATEMENTS"] = "false"
+
+    from app import create_app
+    from app.db import init_db
+
+    started = time.perf_counter()
+    app = create_app()
+    print(f"create_app: {(time.perf_counter() - started) * 1000:.1f} ms")
+    app.config.update(SECRET_KEY=app.config.get("SECRET_KEY") or "benchmark", SESSION_COOKIE_SECURE=False)
+    app.extensions["db_pool"].cursor_factory = CountingCursor
+
+    with app.app_context():
+        init_db()
+
+    client = app.test_client()
+    client.post("/auth/login", data={"email": "test123@gmail.com", "password": "asdf"})
+
+    run = int(time.time())
+    results = {}
+    for size in sorted(int(size) for size in args.sizes.split(",")):
+        seed_records(app, size)
+        sample = fetch_sample(app)
+        results[str(size)] = {}
+        print(f"\n{size} records")
+        print(f"{'route':<36} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'conns':>6} {'peak KiB':>10}")
+        for name, factor, request in build_routes(sample, run):
+            stats = measure(client, request, max(3, int(args.iterations * factor)), app.extensions["db_pool"])
+            results[str(size)][name] = stats
+            print(f"{name:<36} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['queries']:>8} "
+                  f"{stats['checkouts']:>6} {stats['peak_kib']:>10}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            print("\nCompared with baseline")
+            regressions = compare(results, json.load(file), args.threshold)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f"\nSaved baseline to {args.baseline}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
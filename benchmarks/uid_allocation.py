@@ -0,0 +1,100 @@
+"""
+Measure UID allocation throughput with several creators inserting records in parallel.
+
+Each worker process opens its own connection (like a gunicorn worker) and creates records
+through Record.create_record. The run fails if any insert errors or two records share a UID.
+Inserted records are removed afterwards.
+
+Usage:
+    python benchmarks/uid_allocation.py --workers 8 --records 500
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from multiprocessing import Pool
+
+import psycopg2
+import psycopg2.extras
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.dao.RecordDao import Record  # noqa: E402
+from app.db import get_database_uri  # noqa: E402
+
+
+def connect(dsn):
+    """Open a connection configured like the app's pool."""
+    return psycopg2.connect(dsn, cursor_factory=psycopg2.extras.DictCursor)
+
+
+def create_records(args):
+    """Create records from one worker and return (uids, failures, seconds)."""
+    dsn, run_id, worker, count, user_id = args
+    db = connect(dsn)
+    record_dao = Record(db)
+    uids = []
+    failures = 0
+    started = time.perf_counter()
+    for i in range(count):
+        record = record_dao.create_record(
+            {
+                "user_id": user_id,
+                "record_name": f"bench-{run_id}-{worker}-{i}",
+                "project1_id": 1,
+                "project2_id": 0,
+                "record_description": "UID allocation benchmark",
+                "invenio": False,
+                "data_location_type": "other",
+                "data_location": "benchmark",
+                "db_created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+        )
+        if record is None:
+            failures += 1
+            db.rollback()
+        else:
+            uids.append(record["uid"])
+    elapsed = time.perf_counter() - started
+    db.close()
+    return uids, failures, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=get_database_uri(), help="database URI (default: app environment)")
+    parser.add_argument("--workers", type=int, default=4, help="parallel creator processes")
+    parser.add_argument("--records", type=int, default=250, help="records created per worker")
+    parser.add_argument("--user-id", type=int, default=1, help="creator user id")
+    args = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    jobs = [(args.dsn, run_id, worker, args.records, args.user_id) for worker in range(args.workers)]
+
+    started = time.perf_counter()
+    with Pool(args.workers) as pool:
+        results = pool.map(create_records, jobs)
+    wall = time.perf_counter() - started
+
+    uids = [uid for worker_uids, _, _ in results for uid in worker_uids]
+    failures = sum(failures for _, failures, _ in results)
+    duplicates = len(uids) - len(set(uids))
+
+    print(f"workers:          {args.workers}")
+    print(f"records created:  {len(uids)}")
+    print(f"failed inserts:   {failures}")
+    print(f"duplicate UIDs:   {duplicates}")
+    print(f"wall time:        {wall:.2f}s")
+    print(f"throughput:       {len(uids) / wall:.0f} records/s")
+    print(f"mean per insert:  {1000 * sum(t for _, _, t in results) / max(len(uids), 1):.2f}ms")
+
+    with connect(args.dsn) as db, db.cursor() as cursor:
+        cursor.execute("DELETE FROM record WHERE record_name LIKE %s", (f"bench-{run_id}-%",))
+
+    sys.exit(1 if failures or duplicates else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Compare the old and new record visibility queries behind /record/update.
+
+The old query joined userprojects on the creator, multiplying every record by the creator's
+project count, then de-duplicated with DISTINCT and a correlated EXISTS. The new one filters
+on the viewer's project set through the project indexes and pages with a keyset.
+
+The database at --dsn is wiped with init-db. Records are spread evenly over --projects
+projects, the viewer is assigned to one of them and the creator to --creator-projects, so
+the visible share stays fixed while the table grows. Expect the old query to grow with
+total records x creator assignments, the new full fetch with visible records only and the
+new first page to stay flat.
+
+Usage:
+    BENCH_DATABASE_URI=postgresql://localhost/uid_bench python benchmarks/visibility.py
+    python benchmarks/visibility.py --sizes 10000,100000,1000000 --projects 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The query fetch_project_record ran before the rewrite, with its parameter fixed
+LEGACY_QUERY = """
+SELECT DISTINCT record_id, record_name, u.firstname, u.lastname, r.created, r.data_location_type,
+       r.record_description, r.data_location, invenio, u.email, p1.project_name as project1_name,
+       p2.project_name as project2_name, uid
+FROM record r
+JOIN users u ON r.creator_id=u.user_id
+JOIN project p1 ON r.project_id_1=p1.project_id
+JOIN project p2 ON r.project_id_2=p2.project_id
+JOIN userprojects up ON r.creator_id=up.user_id
+WHERE EXISTS (
+    SELECT *
+    FROM userprojects up2
+    WHERE up2.user_id = %s
+        AND (up2.project_id = r.project_id_1
+            OR up2.project_id = r.project_id_2)
+)
+"""
+
+VIEWER_ID = 2
+CREATOR_ID = 1
+
+
+def setup(db, projects, creator_projects):
+    """Creates the benchmark projects and assignments on a fresh database."""
+    cursor = db.cursor()
+    cursor.execute(
+        "INSERT INTO project (project_id, created, project_name, code, finished)"
+        " SELECT 100 + i, TIMESTAMP '2023-08-08', 'bench-project-' || i, 'B' || chr(65 + i % 26), FALSE"
+        " FROM generate_series(0, %s) AS i",
+        (projects - 1,),
+    )
+    cursor.execute("DELETE FROM userprojects WHERE user_id IN (%s, %s)", (VIEWER_ID, CREATOR_ID))
+    cursor.execute("INSERT INTO userprojects (user_id, project_id) VALUES (%s, 100)", (VIEWER_ID,))
+    cursor.execute(
+        "INSERT INTO userprojects (user_id, project_id) SELECT %s, 100 + i FROM generate_series(0, %s) AS i",
+        (CREATOR_ID, creator_projects - 1),
+    )
+    db.commit()
+
+
+def grow(db, total, projects):
+    """Grows the record table to total rows spread evenly over the benchmark projects."""
+    cursor = db.cursor()
+    cursor.execute("SELECT COUNT(*) FROM record")
+    start = cursor.fetchone()[0] + 1
+    if start > total:
+        return
+    cursor.execute(
+        """
+        INSERT INTO record (creator_id, project_id_1, project_id_2, created, record_name,
+                            record_description, data_location_type, data_location, invenio, uid)
+        SELECT %(creator)s, 100 + i %% %(projects)s, 0, TIMESTAMP '2023-08-08' + i * INTERVAL '37 seconds',
+               'visibility-' || i, 'Visibility benchmark record ' || i, 'local', '/data/visibility/' || i,
+               FALSE, 'VIS' || i
+        FROM generate_series(%(start)s, %(total)s) AS i
+        """,
+        {"creator": CREATOR_ID, "projects": projects, "start": start, "total": total},
+    )
+    db.commit()
+    cursor.execute("ANALYZE")
+    db.commit()
+
+
+def timed(run, iterations):
+    """Returns the median milliseconds and row count of a query function."""
+    rows = run()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        rows = run()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies), len(rows or [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URI"), help="benchmark database (is wiped)")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma separated record counts")
+    parser.add_argument("--projects", type=int, default=50, help="projects the records are spread over")
+    parser.add_argument("--creator-projects", type=int, default=5, help="projects the creator is assigned to")
+    parser.add_argument("--page-size", type=int, default=100, help="rows per page for the paginated query")
+    parser.add_argument("--iterations", type=int, default=10, help="runs per query and size")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("set --dsn or BENCH_DATABASE_URI to a database that may be wiped")
+
+    os.environ["FLASK_ENV"] = "development"
+    os.environ["DEV_DATABASE_URI"] = args.dsn
+
+    from app import create_app
+    from app.db import get_db, get_recorddao, init_db
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        setup(get_db(), args.projects, args.creator_projects)
+
+    print(f"{'records':>9} {'legacy ms':>10} {'rows':>7} {'all visible ms':>15} {'rows':>7} {'first page ms':>14}")
+    for size in sorted(int(size) for size in args.sizes.split(",")):
+        with app.app_context():
+            db = get_db()
+            grow(db, size, args.projects)
+            cursor = db.cursor()
+            record_dao = get_recorddao()
+
+            def legacy():
+                cursor.execute(LEGACY_QUERY, (VIEWER_ID,))
+                return cursor.fetchall()
+
+            legacy_ms, legacy_rows = timed(legacy, args.iterations)
+            visible_ms, visible_rows = timed(lambda: record_dao.fetch_project_record(VIEWER_ID), args.iterations)
+            page_ms, _ = timed(
+                lambda: record_dao.fetch_project_record(VIEWER_ID, {"limit": args.page_size}), args.iterations
+            )
+        print(f"{size:>9} {legacy_ms:>10.1f} {legacy_rows:>7} {visible_ms:>15.1f} {visible_rows:>7} {page_ms:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
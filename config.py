@@ -13,9 +13,79 @@ class Config:
     SECRET_KEY = environ.get("SECRET_KEY")
     SESSION_COOKIE_NAME = environ.get("SESSION_COOKIE_NAME")
     SESSION_COOKIE_SECURE = True
+
+    # Keep session data in SQLite (instance/sessions.sqlite3 unless SESSION_DB_PATH is set);
+    # the cookie then only holds a signed session id
+    SERVER_SESSIONS = environ.get("SERVER_SESSIONS", "true").lower() in ("1", "true", "yes")
+    SESSION_DB_PATH = environ.get("SESSION_DB_PATH")
+    SESSION_MAX_BYTES = int(environ.get("SESSION_MAX_BYTES", 4096))
+    SESSION_SWEEP_INTERVAL = float(environ.get("SESSION_SWEEP_INTERVAL", 300))
     STATIC_FOLDER = "static"
     TEMPLATES_FOLDER = "templates"
 
+    # Connection pool, sized per worker process
+    DB_POOL_MIN_SIZE = int(environ.get("DB_POOL_MIN_SIZE", 1))
+    DB_POOL_MAX_SIZE = int(environ.get("DB_POOL_MAX_SIZE", 10))
+    DB_POOL_TIMEOUT = float(environ.get("DB_POOL_TIMEOUT", 5))
+    DB_POOL_MAX_LIFETIME = float(environ.get("DB_POOL_MAX_LIFETIME", 1800))
+    # Optional streaming replica for fetch_*/check_*/stream_* DAO calls; a user's reads stay on
+    # the primary for DB_REPLICA_STICKY_SECONDS after they write, so they see their own changes
+    DB_REPLICA_URI = environ.get("DB_REPLICA_URI")
+    DB_REPLICA_STICKY_SECONDS = float(environ.get("DB_REPLICA_STICKY_SECONDS", 10))
+    # Prepare record query shapes once per pooled connection; turn off behind transaction poolers
+    DB_PREPARED_STATEMENTS = environ.get("DB_PREPARED_STATEMENTS", "true").lower() in ("1", "true", "yes")
+
+    # LISTEN for writes to users, project and userprojects in each worker; turn off behind
+    # transaction poolers, which do not keep LISTEN sessions
+    DB_NOTIFICATIONS = environ.get("DB_NOTIFICATIONS", "true").lower() in ("1", "true", "yes")
+
+    # Seconds a worker keeps the logged-in user cached; with DB_NOTIFICATIONS any write to users
+    # invalidates it on every worker, without it the user is read on every request
+    AUTH_CACHE_TTL = float(environ.get("AUTH_CACHE_TTL", 30))
+
+    # Project lists, user email lists and project assignments cached per worker
+    REFERENCE_CACHE_TTL = float(environ.get("REFERENCE_CACHE_TTL", 60))
+    REFERENCE_CACHE_SIZE = int(environ.get("REFERENCE_CACHE_SIZE", 256))
+
+    # Bytes of rendered table rows cached per worker; 0 renders every row
+    FRAGMENT_CACHE_BYTES = int(environ.get("FRAGMENT_CACHE_BYTES", 32 * 1024 * 1024))
+
+    # Record table pagination
+    RECORD_PAGE_SIZE = int(environ.get("RECORD_PAGE_SIZE", 100))
+    RECORD_MAX_PAGE_SIZE = int(environ.get("RECORD_MAX_PAGE_SIZE", 500))
+
+    # Rows fetched per round trip while streaming CSV exports
+    CSV_EXPORT_BATCH_SIZE = int(environ.get("CSV_EXPORT_BATCH_SIZE", 2000))
+
+    # Rows validated and loaded per COPY during bulk imports
+    RECORD_IMPORT_BATCH_SIZE = int(environ.get("RECORD_IMPORT_BATCH_SIZE", 1000))
+
+    # Per-request query timing, slow-query log and Server-Timing headers
+    QUERY_INSTRUMENTATION = environ.get("QUERY_INSTRUMENTATION", "false").lower() in ("1", "true", "yes")
+    SLOW_QUERY_MS = float(environ.get("SLOW_QUERY_MS", 200))
+
+    # ETags and 304 responses for record and project fragments; ETAG_SALT defaults to a deploy fingerprint
+    CONDITIONAL_REQUESTS = environ.get("CONDITIONAL_REQUESTS", "true").lower() in ("1", "true", "yes")
+    ETAG_SALT = environ.get("ETAG_SALT")
+
+    # On-the-fly gzip/brotli for text responses of at least COMPRESSION_MIN_SIZE bytes;
+    # brotli is used when installed and COMPRESSION_BROTLI_QUALITY is not 0
+    COMPRESSION_ENABLED = environ.get("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+    COMPRESSION_MIN_SIZE = int(environ.get("COMPRESSION_MIN_SIZE", 1024))
+    COMPRESSION_GZIP_LEVEL = int(environ.get("COMPRESSION_GZIP_LEVEL", 6))
+    COMPRESSION_BROTLI_QUALITY = int(environ.get("COMPRESSION_BROTLI_QUALITY", 4))
+    COMPRESSION_MIMETYPES = environ.get(
+        "COMPRESSION_MIMETYPES", "text/html,text/csv,text/plain,application/json"
+    ).split(",")
+
+    # Prometheus /metrics endpoint, off by default; scrapers must send METRICS_TOKEN as a bearer
+    # token, or connect from localhost when no token is set
+    METRICS_ENABLED = environ.get("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+    METRICS_TOKEN = environ.get("METRICS_TOKEN")
+
+    # Largest block of UIDs a single reservation may request
+    UID_RESERVATION_MAX = int(environ.get("UID_RESERVATION_MAX", 10000))
+
 
 class ProdConfig(Config):
     """Production config."""
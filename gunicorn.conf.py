@@ -0,0 +1,21 @@
+"""Gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:app"""
+import os
+import shutil
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+
+
+def on_starting(server):
+    """Start every run with an empty Prometheus multiprocess directory."""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop the live metrics of an exited worker."""
+    from app.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid)
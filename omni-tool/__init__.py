@@ -1,22 +1,32 @@
 """Main application module.
 
 Creates and configures the Flask app instance.
-Registers blueprints and assets.
+Registers blueprints and the prebuilt asset manifest.
 """
 import os
 
 from flask import Flask, redirect, url_for
-from flask_assets import Bundle, Environment
 
 from config import DevConfig, ProdConfig
 
-from . import auth, db, project, record, user
+from . import assets, auth, cache, compression, db, etag, fragments, instrumentation, listener, metrics, project, record, sessions, stats, user
 
 
 def create_app():
     """Create and configure the Flask application."""
     # create and configure the app
     app = Flask(__name__, instance_relative_config=True)
+    app.config.from_object(DevConfig if os.environ.get("FLASK_ENV") == "development" else ProdConfig)
+
+    sessions.init_app(app)
+    db.init_app(app)
+    listener.init_app(app)
+    compression.init_app(app)
+    instrumentation.init_app(app)
+    metrics.init_app(app)
+    cache.init_app(app)
+    etag.init_app(app)
+    fragments.init_app(app)
 
     app.register_blueprint(auth.bp)
 
@@ -26,13 +36,9 @@ def create_app():
 
     app.register_blueprint(user.bp)
 
-    assets = Environment(app)
-    css = Bundle("src/main.css", output="dist/main.css")
-    js = Bundle("src/*.js", output="dist/main.js")
-    assets.register("css", css)
-    assets.register("js", js)
-    css.build()
-    js.build()
+    app.register_blueprint(stats.bp)
+
+    assets.init_app(app)
 
     @app.route("/")
     def root():
@@ -0,0 +1,153 @@
+"""
+This module builds and serves the fingerprinted CSS and JS bundles.
+
+`flask build-assets` runs at image build time: it minifies each bundle, names the result
+after a hash of its content, writes gzip (and brotli, if installed) copies next to it and
+records the names in static/dist/manifest.json. Workers only read the manifest at startup.
+Without a manifest, e.g. in development, templates fall back to the unminified bundles.
+
+Routes:
+- GET /static/dist/<path:filename> : Serve a bundle, precompressed when the client accepts it
+"""
+import glob
+import gzip
+import hashlib
+import json
+import os
+
+import click
+import rcssmin
+import rjsmin
+from flask import Flask, current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip copies are always written
+    brotli = None
+
+# Bundle name -> source files, relative to the static folder
+BUNDLES = {
+    # Compiled by tailwind (npm run tailwind-build)
+    "main.css": ["dist/main.css"],
+    "main.js": ["src/*.js"],
+}
+DIST = "dist"
+MANIFEST = "manifest.json"
+FAR_FUTURE = 365 * 24 * 60 * 60
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def read_sources(static_folder, patterns):
+    """Concatenates the files matched by the patterns, in sorted order per pattern."""
+    parts = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(static_folder, pattern))):
+            with open(path, encoding="utf-8") as file:
+                parts.append(file.read())
+    return "\n".join(parts)
+
+
+def minify(name, source):
+    """Minifies CSS or JS source."""
+    if name.endswith(".css"):
+        return rcssmin.cssmin(source)
+    return rjsmin.jsmin(source)
+
+
+def write_compressed(path, data):
+    """Writes gzip and, when available, brotli copies of a built bundle."""
+    with open(path + ".gz", "wb") as file:
+        file.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as file:
+            file.write(brotli.compress(data, quality=11))
+
+
+def build_assets(static_folder):
+    """Builds every bundle into static/dist and returns the manifest."""
+    dist = os.path.join(static_folder, DIST)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name, patterns in BUNDLES.items():
+        source = read_sources(static_folder, patterns)
+        if name == "main.js":
+            # Unminified fallback for running without a manifest
+            with open(os.path.join(dist, name), "w", encoding="utf-8") as file:
+                file.write(source)
+
+        data = minify(name, source).encode("utf-8")
+        stem, extension = os.path.splitext(name)
+        built = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}"
+        with open(os.path.join(dist, built), "wb") as file:
+            file.write(data)
+        write_compressed(os.path.join(dist, built), data)
+        manifest[name] = built
+
+    with open(os.path.join(dist, MANIFEST), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    """Returns the bundle manifest, or an empty one if assets were never built."""
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_url(name):
+    """Returns the URL of a bundle, fingerprinted when the manifest lists it."""
+    filename = current_app.extensions["asset_manifest"].get(name, name)
+    return url_for("static_dist", filename=filename)
+
+
+def serve_dist(filename):
+    """Serves a bundle, preferring a precompressed copy the client accepts."""
+    dist = os.path.join(current_app.static_folder, DIST)
+    fingerprinted = filename in current_app.extensions["fingerprinted_assets"]
+    max_age = FAR_FUTURE if fingerprinted else None
+
+    for encoding, suffix in ENCODINGS:
+        if fingerprinted and encoding in request.accept_encodings \
+                and os.path.isfile(os.path.join(dist, filename + suffix)):
+            response = send_from_directory(
+                dist, filename + suffix, mimetype=mimetype(filename), max_age=max_age
+            )
+            response.headers["Content-Encoding"] = encoding
+            response.headers.pop("Content-Disposition", None)
+            break
+    else:
+        response = send_from_directory(dist, filename, max_age=max_age)
+
+    if fingerprinted:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.vary.add("Accept-Encoding")
+    return response
+
+
+def mimetype(filename):
+    """Returns the content type of a bundle."""
+    return "text/css" if filename.endswith(".css") else "text/javascript"
+
+
+@click.command("build-assets")
+def build_assets_command():
+    """Minify, fingerprint and precompress the CSS and JS bundles"""
+    manifest = build_assets(current_app.static_folder)
+    for name, built in manifest.items():
+        click.echo(f"{name} -> {DIST}/{built}")
+    if brotli is None:
+        click.echo("brotli is not installed; only gzip copies were written")
+
+
+def init_app(app: Flask):
+    """Load the asset manifest and register the bundle route and build command."""
+    manifest = load_manifest(app.static_folder)
+    app.extensions["asset_manifest"] = manifest
+    app.extensions["fingerprinted_assets"] = set(manifest.values())
+    app.add_url_rule(f"{app.static_url_path}/{DIST}/<path:filename>", "static_dist", serve_dist)
+    app.add_template_global(asset_url)
+    app.cli.add_command(build_assets_command)
@@ -20,7 +20,7 @@ Helper Functions:
 - is_logged_in : Check if a user is logged in
 - login_required : Require login to access view
 - admin_permissions : Require admin permissions to access view
-- get_current_user : Get user object for currently logged in user
+- get_current_user : Get user object for currently logged in user, cached per worker
 - load_logged_in_user : Set global user object before request
 
 """
@@ -31,7 +31,9 @@ import re
 from flask import Blueprint, redirect, render_template, request, session, url_for, g
 from werkzeug.security import check_password_hash
 
+from app.cache import identity_cache
 from app.db import get_userdao
+from app.listener import table_listener
 
 bp = Blueprint("auth", __name__, url_prefix="/auth")
 
@@ -79,13 +81,27 @@ def get_current_user():
     if user_id is None:
         return None
 
-    user = get_userdao().fetch_user(user_id)[0] if len(get_userdao().fetch_user(user_id)) > 0 else None
+    # Keyed by the users version this worker last heard of, so a role change, deactivation or
+    # removal through any worker is seen by every worker without a query per request
+    versions = table_listener.versions(("users",))
+    key = (user_id, versions)
+    user = identity_cache.get(key) if versions is not None else None
+    if user is None:
+        users = get_userdao().fetch_user(user_id)
+        user = dict(users[0]) if users else None
+        if user is not None and versions is not None:
+            identity_cache.set(key, user)
     return user
 
 
 @bp.before_app_request
 def load_logged_in_user():
     """Set global user object before request."""
+    # Static files never need the user, so they never touch the database
+    if request.endpoint in ("static", "static_dist"):
+        g.user = None
+        g.user_role = None
+        return
     g.user = get_current_user()
     if g.user:
         g.user_role = g.user["role"]
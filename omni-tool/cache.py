@@ -0,0 +1,224 @@
+"""
+This module provides small in-process caches shared by the requests a worker serves.
+
+Each gunicorn worker has its own copy. Caches of data that authorizes requests are keyed by
+table versions that every worker sees change: the versions shared through the database (see
+ReferenceCache), or for identities the versions kept by app.listener. A write through any
+worker therefore invalidates them everywhere; plain TTL caches only pick up such writes once
+entries expire.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded, thread-safe LRU cache whose entries expire after ttl seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Returns a live entry, or default if it is missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            expires, value = self._entries.get(key, (0.0, _MISSING))
+            if value is _MISSING or expires <= now:
+                if value is not _MISSING:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Stores an entry, evicting the least recently used one when full."""
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Drops a single entry."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns hit/miss counters and current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+class ReferenceCache(TTLCache):
+    """TTL cache for rarely changing reference data, invalidated by table versions.
+
+    Entries are keyed by the versions of the tables they were read from: the versions shared
+    through the database, which change on every committed write from any worker, plus local
+    counters bumped by this worker's writes so later reads in the same request see them.
+    Entries for older versions are never read again and age out of the LRU. Without shared
+    versions (outside a request, or if they cannot be read) the cache is bypassed.
+    """
+
+    def __init__(self, maxsize=256, ttl=60.0):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._versions = {}
+        # Callable returning the shared versions of a tuple of tables or None, set by db.init_app
+        self.shared_versions = None
+
+    def version(self, *tables):
+        """Returns the current versions of the given tables, or None if they are unknown."""
+        shared = self.shared_versions(tables) if self.shared_versions is not None else None
+        if shared is None:
+            return None
+        return shared, tuple(self._versions.get(table, 0) for table in tables)
+
+    def bump(self, *tables):
+        """Invalidates everything read from the given tables."""
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def cached(self, *tables):
+        """Decorates a DAO read method so its result is cached until the tables change."""
+
+        def decorator(method):
+            @functools.wraps(method)
+            def wrapped(dao, *args):
+                version = self.version(*tables)
+                if version is None:
+                    return method(dao, *args)
+                key = (method.__qualname__, version, args)
+                result = self.get(key, _MISSING)
+                if result is _MISSING:
+                    result = method(dao, *args)
+                    if result is not None:
+                        self.set(key, result)
+                return result
+
+            return wrapped
+
+        return decorator
+
+    def invalidates(self, *tables):
+        """Decorates a DAO write method so it bumps the tables it changes."""
+
+        def decorator(method):
+            @functools.wraps(method)
+            def wrapped(dao, *args, **kwargs):
+                try:
+                    return method(dao, *args, **kwargs)
+                finally:
+                    self.bump(*tables)
+
+            return wrapped
+
+        return decorator
+
+
+class FragmentCache:
+    """Thread-safe LRU cache of rendered HTML, bounded by the memory its entries take.
+
+    An entry is counted as its UTF-8 encoded HTML, the bytes and strings in its key, and
+    ENTRY_OVERHEAD for the objects that hold them.
+    """
+
+    # Approximate bytes of the str object, key tuple and LRU bookkeeping behind each entry
+    ENTRY_OVERHEAD = 256
+
+    def __init__(self, maxbytes=32 * 1024 * 1024):
+        self.maxbytes = maxbytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def entry_size(cls, key, value):
+        """Returns the bytes an entry is counted as."""
+        parts = key if isinstance(key, tuple) else (key,)
+        key_size = sum(len(part) for part in parts if isinstance(part, (bytes, str)))
+        return len(value.encode()) + key_size + cls.ENTRY_OVERHEAD
+
+    def get(self, key, default=None):
+        """Returns a cached fragment, or default if it is missing."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Stores a fragment, evicting the least recently used ones until it fits."""
+        size = self.entry_size(key, value)
+        if size > self.maxbytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[0]
+            self._entries[key] = (size, value)
+            self._bytes += size
+            while self._bytes > self.maxbytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns hit/miss counters and current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "maxbytes": self.maxbytes,
+            }
+
+
+# Logged-in identities (user id, email, names, role, inactive) keyed by user id and the
+# users version from app.listener
+identity_cache = TTLCache(maxsize=4096, ttl=30.0)
+
+# Project lists, user email lists and user-project assignments
+reference_cache = ReferenceCache(maxsize=256, ttl=60.0)
+
+# Rendered table rows keyed by template and a digest of the row
+fragment_cache = FragmentCache(maxbytes=32 * 1024 * 1024)
+
+
+def init_app(app):
+    """Apply cache sizes and TTLs from the app config."""
+    identity_cache.ttl = app.config["AUTH_CACHE_TTL"]
+    reference_cache.ttl = app.config["REFERENCE_CACHE_TTL"]
+    reference_cache.maxsize = app.config["REFERENCE_CACHE_SIZE"]
+    fragment_cache.maxbytes = app.config["FRAGMENT_CACHE_BYTES"]
@@ -0,0 +1,132 @@
+"""
+This module compresses text responses on the fly.
+
+Responses whose mimetype is listed in COMPRESSION_MIMETYPES are sent with brotli (when the
+package is installed and the client accepts it) or gzip. Buffered responses smaller than
+COMPRESSION_MIN_SIZE are left alone. Streamed responses, such as the CSV export, are
+compressed chunk by chunk and flushed after every chunk, so rows still reach the client as
+they are produced. Responses that already carry a Content-Encoding (the precompressed
+bundles) and files sent with send_file are passed through. ETags are weakened on
+compressed responses, since the bytes on the wire differ from the uncompressed body.
+"""
+import time
+import zlib
+
+from flask import Flask, current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+class GzipStream:
+    """Incremental gzip encoder."""
+
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data, flush=True):
+        data = self._compressor.compress(data)
+        return data + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else data
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliStream:
+    """Incremental brotli encoder."""
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data, flush=True):
+        data = self._compressor.process(data)
+        return data + self._compressor.flush() if flush else data
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def negotiate():
+    """Returns the encoding to use for the current request, or None."""
+    accepted = request.accept_encodings
+    if brotli is not None and current_app.config["COMPRESSION_BROTLI_QUALITY"] and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def encoder(encoding):
+    """Returns a fresh encoder for an encoding, configured from the app config."""
+    if encoding == "br":
+        return BrotliStream(current_app.config["COMPRESSION_BROTLI_QUALITY"])
+    return GzipStream(current_app.config["COMPRESSION_GZIP_LEVEL"])
+
+
+def compress_stream(chunks, stream):
+    """Compresses a streamed body, flushing after every chunk."""
+    try:
+        for data in chunks:
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            if data:
+                yield stream.chunk(data)
+        yield stream.finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def weaken_etag(response):
+    """Marks a strong ETag as weak."""
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def compress(response):
+    """Compresses a response when its type, size and the client allow it."""
+    if request.method == "HEAD" or response.status_code < 200:
+        return response
+    if response.status_code == 304:
+        # Revalidations must carry the same ETag as the compressed response they confirm
+        if negotiate() is not None:
+            weaken_etag(response)
+        return response
+    if response.status_code == 204 or response.direct_passthrough \
+            or "Content-Encoding" in response.headers or response.cache_control.no_transform \
+            or response.mimetype not in current_app.config["COMPRESSION_MIMETYPES"]:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoder(encoding))
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config["COMPRESSION_MIN_SIZE"]:
+            return response
+        started = time.perf_counter()
+        stream = encoder(encoding)
+        response.set_data(stream.chunk(data, flush=False) + stream.finish())
+        if current_app.config.get("QUERY_INSTRUMENTATION"):
+            # Server-Timing was added before compression, so this gets an entry of its own
+            response.headers.add("Server-Timing", f"compress;dur={(time.perf_counter() - started) * 1000:.1f}")
+
+    response.headers["Content-Encoding"] = encoding
+    weaken_etag(response)
+    return response
+
+
+def init_app(app: Flask):
+    """Compress responses if COMPRESSION_ENABLED is set. Call before registering other hooks."""
+    if not app.config.get("COMPRESSION_ENABLED"):
+        return
+    # after_request hooks run in reverse order, so this one sees the final response
+    app.after_request(compress)
@@ -4,6 +4,8 @@ This module provides a Project DAO class for interacting with a database table c
 import psycopg2
 from psycopg2.extensions import connection
 
+from app.cache import reference_cache
+
 
 class Project:
     """Project DAO."""
@@ -15,6 +17,7 @@ class Project:
         self.__db = db
         self.__cursor = self.__db.cursor()
 
+    @reference_cache.cached("project")
     def fetch_projects(self):
         """Fetches all projects from the database."""
         try:
@@ -46,6 +49,7 @@ class Project:
             print("Error fetching projects: ", e)
             return None
 
+    @reference_cache.cached("project", "userprojects")
     def fetch_project_by_user(self, user_id):
         """Fetches projects associated with a given user."""
         base_query = """
@@ -55,12 +59,13 @@ class Project:
                 WHERE up.user_id = %s
                 """
         try:
-            self.__cursor.execute(base_query, (str(user_id)))
+            self.__cursor.execute(base_query, (user_id,))
             return self.__cursor.fetchall()
         except psycopg2.Error as e:
             print("Error fetching projects: ", e)
             return None
 
+    @reference_cache.invalidates("project")
     def create_project(self, project_info):
         """Creates a new project."""
         create_date = project_info["created"]
@@ -89,6 +94,7 @@ class Project:
             print("Error creating project: ", e)
             return None
 
+    @reference_cache.invalidates("project")
     def update_project(self, project_info, project_id):
         """Updates a project."""
         project_name = project_info["project_name"]
@@ -102,6 +108,7 @@ class Project:
         except psycopg2.Error as e:
             print("Error updating project: ", e)
 
+    @reference_cache.invalidates("project", "userprojects")
     def remove_project(self, project_id):
         """Removes a project."""
         try:
@@ -2,19 +2,51 @@
 This module provides a Record DAO class for interacting with a database table called 'record'.
 """
 import csv
+import functools
+import hashlib
 import io
+import re
 from datetime import datetime
 
 import psycopg2
-from psycopg2.extensions import connection
+import psycopg2.errors
+from psycopg2.extensions import TRANSACTION_STATUS_INTRANS, connection
+
+
+# ts_headline match delimiters; private-use characters never occur in stored text
+HIGHLIGHT_START = "\ue000"
+HIGHLIGHT_STOP = "\ue001"
+HEADLINE_OPTIONS = f'StartSel="{HIGHLIGHT_START}", StopSel="{HIGHLIGHT_STOP}", MaxWords=35, MinWords=15'
+
+SEARCH_QUERY = "websearch_to_tsquery('english', %(search)s)"
+SEARCH_RANK = f"ts_rank(r.search_document, {SEARCH_QUERY})"
+
+
+PLACEHOLDER = re.compile(r"%\((\w+)\)s")
+
+# Statements prepared on one connection before they are all deallocated
+MAX_PREPARED_STATEMENTS = 128
+# Savepoint that confines a failed PREPARE or EXECUTE inside the caller's transaction
+SHAPE_SAVEPOINT = "record_shape"
+
+
+def escape_like(value: str):
+    """Escapes LIKE wildcards so user input is matched literally."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def prefix_upper_bound(prefix: str):
+    """Returns the smallest string above every string starting with prefix, in byte order."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
 
 
 def build_query(filters: dict):
     """Builds a SQL query based on the provided filters."""
-    base_query = """
+    columns = """
     SELECT record_id, record_name, u.firstname, u.lastname, r.created, r.data_location_type, r.record_description,
            r.data_location, invenio, u.email, p1.project_name as project1_name, 
-           p2.project_name as project2_name, uid
+           p2.project_name as project2_name, uid"""
+    tables = """
     FROM record r 
     JOIN users u on r.creator_id=u.user_id
     JOIN project p1 ON r.project_id_1=p1.project_id 
@@ -22,6 +54,21 @@ def build_query(filters: dict):
     """
     where_clauses = []
     params = {}
+    search = "search" in filters and filters["search"] != ""
+
+    if search:
+        where_clauses.append(f"r.search_document @@ {SEARCH_QUERY}")
+        params["search"] = filters["search"]
+
+        # Rank and snippets are only computed for rows that are displayed
+        if filters.get("highlight"):
+            columns += f""",
+           {SEARCH_RANK} AS search_rank,
+           ts_headline('english', r.record_description, {SEARCH_QUERY}, %(headline_options)s)
+               AS description_snippet,
+           ts_headline('english', r.data_location, {SEARCH_QUERY}, %(headline_options)s)
+               AS location_snippet"""
+            params["headline_options"] = HEADLINE_OPTIONS
 
     if "record_id" in filters:
         where_clauses.append("record_id = %(record_id)s")
@@ -38,8 +85,9 @@ def build_query(filters: dict):
 
     # Needed to rename this one because this is used for filters
     if "record_name_match" in filters and filters["record_name_match"] != "":
+        # Served by the record_name trigram index
         where_clauses.append("record_name ILIKE %(record_name_match)s")
-        params["record_name_match"] = "%" + filters["record_name_match"] + "%"
+        params["record_name_match"] = "%" + escape_like(filters["record_name_match"]) + "%"
 
     if "data_location_type" in filters and filters["data_location_type"] != "":
         where_clauses.append("r.data_location_type = %(data_location_type)s")
@@ -71,18 +119,83 @@ def build_query(filters: dict):
         where_clauses.append("user_id = %(user_id)s")
         params["user_id"] = filters["user_id"]
 
+    # Records in any of the viewer's projects. The project list is an InitPlan computed once,
+    # so both project indexes are bitmap-ORed instead of fanning out through userprojects.
+    if "visible_to" in filters:
+        where_clauses.append(
+            "(r.project_id_1 = ANY(ARRAY(SELECT project_id FROM userprojects WHERE user_id = %(visible_to)s))"
+            " OR r.project_id_2 = ANY(ARRAY(SELECT project_id FROM userprojects WHERE user_id = %(visible_to)s)))"
+        )
+        params["visible_to"] = filters["visible_to"]
+
     if "uid" in filters and filters["uid"] != "":
-        where_clauses.append("uid ILIKE %(uid)s")
-        params["uid"] = "%" + filters["uid"] + "%"
+        uid = filters["uid"].strip().upper()
+        if uid.startswith("CRC"):
+            # UIDs are upper case CRC<date><seq><codes>, so a typed prefix is a btree range scan.
+            # The bounds are explicit: a generic plan of a prepared LIKE $n cannot use the index.
+            where_clauses.append("uid ~>=~ %(uid_from)s AND uid ~<~ %(uid_to)s")
+            params["uid_from"] = uid
+            params["uid_to"] = prefix_upper_bound(uid)
+        else:
+            # Served by the uid trigram index
+            where_clauses.append("uid ILIKE %(uid)s")
+            params["uid"] = "%" + escape_like(uid) + "%"
+
+    # Keyset pagination: continue strictly after the last row of the previous page
+    if search and "after_rank" in filters and "after_record_id" in filters:
+        where_clauses.append(
+            f"({SEARCH_RANK}, r.record_id) < (%(after_rank)s::real, %(after_record_id)s)"
+        )
+        params["after_rank"] = filters["after_rank"]
+        params["after_record_id"] = filters["after_record_id"]
+    elif "after_created" in filters and "after_record_id" in filters:
+        where_clauses.append(
+            "(r.created, r.record_id) < (%(after_created)s, %(after_record_id)s)"
+        )
+        params["after_created"] = filters["after_created"]
+        params["after_record_id"] = filters["after_record_id"]
 
+    base_query = columns + tables
     if where_clauses:
         base_query += " WHERE " + " AND ".join(where_clauses)
 
-    base_query += " ORDER BY r.created DESC"
+    if search:
+        base_query += f" ORDER BY {SEARCH_RANK} DESC, r.record_id DESC"
+    else:
+        base_query += " ORDER BY r.created DESC, r.record_id DESC"
+
+    if "limit" in filters:
+        base_query += " LIMIT %(limit)s"
+        params["limit"] = filters["limit"]
 
     return base_query, params
 
 
+# Prepared statement name -> the build_query text it was prepared from, for query logs
+PREPARED_QUERIES = {}
+
+
+def prepared_query(name: str):
+    """Returns the query a record statement was prepared from, or None for unknown names."""
+    return PREPARED_QUERIES.get(name)
+
+
+@functools.lru_cache(maxsize=512)
+def prepare_shape(query: str):
+    """Returns the statement name, PREPARE text and parameter order for a build_query shape."""
+    order = []
+
+    def number(match):
+        if match.group(1) not in order:
+            order.append(match.group(1))
+        return f"${order.index(match.group(1)) + 1}"
+
+    text = PLACEHOLDER.sub(number, query).replace("%%", "%")
+    name = "record_" + hashlib.sha1(query.encode()).hexdigest()[:16]
+    PREPARED_QUERIES[name] = query
+    return name, f"PREPARE {name} AS {text}", tuple(order)
+
+
 def write_to_csv(rows):
     """Writes rows to a CSV file."""
     try:
@@ -107,26 +220,93 @@ class Record:
     __db = None
     __cursor = None
 
-    def __init__(self, db: connection):
+    def __init__(self, db: connection, prepare_statements: bool = False):
         self.__db = db
         self.__cursor = self.__db.cursor()
+        self.__prepare_statements = prepare_statements
+
+    def __execute_shape(self, query, params):
+        """Executes a build_query statement, prepared once per pooled connection.
+
+        Inside an open transaction the statement runs under a savepoint, sent in the same round
+        trip, so a lost or duplicate prepared statement is recovered from without discarding
+        the caller's work. Outside one, the failed statement is all a rollback discards.
+        """
+        prepared = getattr(self.__db, "prepared", None)
+        if not self.__prepare_statements or prepared is None:
+            self.__cursor.execute(query, params)
+            return
+
+        name, prepare, order = prepare_shape(query)
+        execute = f"EXECUTE {name} ({', '.join(['%s'] * len(order))})" if order else f"EXECUTE {name}"
+        values = [params[key] for key in order]
+        savepoint = self.__db.info.transaction_status == TRANSACTION_STATUS_INTRANS
+        if savepoint:
+            execute = f"SAVEPOINT {SHAPE_SAVEPOINT}; {execute}"
+        try:
+            if name not in prepared:
+                self.__prepare(name, prepare, prepared, savepoint)
+            self.__cursor.execute(execute, values)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # The session lost its prepared statements; prepare again and retry once
+            self.__recover(savepoint)
+            prepared.clear()
+            self.__prepare(name, prepare, prepared, savepoint)
+            self.__cursor.execute(execute, values)
+
+    def __prepare(self, name, prepare, prepared: set, savepoint: bool):
+        """Prepares a statement on this connection, making room when too many are held."""
+        if len(prepared) >= MAX_PREPARED_STATEMENTS:
+            self.__cursor.execute("DEALLOCATE ALL")
+            prepared.clear()
+        if savepoint:
+            prepare = f"SAVEPOINT {SHAPE_SAVEPOINT}; {prepare}; RELEASE SAVEPOINT {SHAPE_SAVEPOINT}"
+        try:
+            self.__cursor.execute(prepare)
+        except psycopg2.errors.DuplicatePreparedStatement:
+            self.__recover(savepoint)
+        prepared.add(name)
+
+    def __recover(self, savepoint: bool):
+        """Undoes a failed shape statement without touching the rest of the caller's transaction."""
+        if savepoint:
+            self.__cursor.execute(f"ROLLBACK TO SAVEPOINT {SHAPE_SAVEPOINT}")
+        else:
+            # The statement opened the transaction, so it is the only thing rolled back
+            self.__db.rollback()
 
     def fetch_record_table(self, filters: dict):
         """Fetches record from the database."""
         query, params = build_query(filters)
         try:
-            self.__cursor.execute(query, params)
+            self.__execute_shape(query, params)
             return self.__cursor.fetchall()
         except psycopg2.Error as e:
             print("Error fetching record", str(e))
             return None
 
+    def stream_record_table(self, filters: dict, batch_size: int = 2000):
+        """Yields batches of record rows through a server-side cursor."""
+        query, params = build_query(filters)
+        try:
+            with self.__db.cursor(name="record_export") as cursor:
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+        except psycopg2.Error as e:
+            # Abort the chunked response; ending it normally would pass off a truncated export as complete
+            print("Error streaming record", str(e))
+            raise
+
     def fetch_record_by_name(self, name):
         """Fetches record by name."""
         name_check = {"record_name_exclusive": name}
         query, params = build_query(name_check)
         try:
-            self.__cursor.execute(query, params)
+            self.__execute_shape(query, params)
             return self.__cursor.fetchone()
         except psycopg2.Error as e:
             print("Error fetching record", str(e))
@@ -137,84 +317,233 @@ class Record:
         id_check = {"record_id": record_id}
         query, params = build_query(id_check)
         try:
-            self.__cursor.execute(query, params)
-            return self.__cursor.fetchone()
-        except psycopg2.Error as e:
-            print("Error fetching record", str(e))
-            return None
-
-    def fetch_last_record_id(self):
-        """Fetches the last record id."""
-        try:
-            self.__cursor.execute("SELECT record_id FROM record ORDER by record_id DESC LIMIT 1")
+            self.__execute_shape(query, params)
             return self.__cursor.fetchone()
         except psycopg2.Error as e:
             print("Error fetching record", str(e))
             return None
 
     def create_record(self, record_info: dict):
-        """Creates a new record."""
-        uid = record_info["uid"]
+        """Creates a new record, allocating its UID or claiming its reserved_uid in the same statement.
+
+        A reserved UID is only claimed if it is reserved for the record's project pair;
+        otherwise the insert fails and the reservation is kept.
+        """
         user_id = record_info["user_id"]
         record_name = record_info["record_name"]
         project1_id = record_info["project1_id"]
         project2_id = record_info["project2_id"]
         record_description = record_info["record_description"]
-        invenio = "invenio" in record_info
+        invenio = record_info["invenio"]
         data_location_type = record_info["data_location_type"]
         data_location = record_info["data_location"]
         db_created = record_info["db_created"]
 
-        query = """
+        reserved_uid = record_info.get("reserved_uid")
+
+        uid = "allocate_uid(%(project1_id)s, %(project2_id)s, %(created)s)"
+        claim = ""
+        if reserved_uid:
+            # Without a matching reservation the UID is NULL and the insert is rejected
+            uid = "(SELECT uid FROM claimed)"
+            claim = """
+                WITH claimed AS (
+                    DELETE FROM uidreservation
+                    WHERE uid = %(reserved_uid)s AND project_id_1 = %(project1_id)s AND project_id_2 = %(project2_id)s
+                    RETURNING uid)
+                """
+        query = claim + f"""
                 INSERT INTO record (creator_id, project_id_1, project_id_2, created, record_name, record_description,
                 data_location_type, data_location, invenio, uid)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING record_id;
+                VALUES (%(user_id)s, %(project1_id)s, %(project2_id)s, %(created)s, %(record_name)s,
+                %(record_description)s, %(data_location_type)s, %(data_location)s, %(invenio)s,
+                {uid})
+                RETURNING record_id, uid;
                 """
-        values = (
-            user_id,
-            project1_id,
-            project2_id,
-            db_created,
-            record_name,
-            record_description,
-            data_location_type,
-            data_location,
-            invenio,
-            uid,
-        )
+        values = {
+            "reserved_uid": reserved_uid,
+            "user_id": user_id,
+            "project1_id": project1_id,
+            "project2_id": project2_id,
+            "created": db_created,
+            "record_name": record_name,
+            "record_description": record_description,
+            "data_location_type": data_location_type,
+            "data_location": data_location,
+            "invenio": invenio,
+        }
         try:
             self.__cursor.execute(query, values)
+            created = self.__cursor.fetchone()
             self.__db.commit()
+            return created
         except psycopg2.Error as e:
             print("Error creating record", str(e))
+            self.__db.rollback()
+            return None
 
-    def fetch_project_record(self, user_id):
-        """Fetches project record."""
-        base_query = """
-        SELECT DISTINCT record_id, record_name, u.firstname, u.lastname, r.created, r.data_location_type, 
-               r.record_description, r.data_location, invenio, u.email, p1.project_name as project1_name, 
-               p2.project_name as project2_name, uid
-        FROM record r 
-        JOIN users u ON r.creator_id=u.user_id
-        JOIN project p1 ON r.project_id_1=p1.project_id 
-        JOIN project p2 ON r.project_id_2=p2.project_id
-        JOIN userprojects up ON r.creator_id=up.user_id
-        WHERE EXISTS (
-            SELECT *
-            FROM userprojects up2
-            WHERE up2.user_id = %s
-                AND (up2.project_id = r.project_id_1
-                    OR up2.project_id = r.project_id_2)
-        )
-        """
+    def fetch_existing_record_names(self, record_names: list):
+        """Fetches which of the given record names are already taken."""
         try:
-            self.__cursor.execute(base_query, str(user_id))
-            return self.__cursor.fetchall()
+            self.__cursor.execute(
+                "SELECT record_name FROM record WHERE record_name = ANY(%s)", (record_names,)
+            )
+            return {row[0] for row in self.__cursor.fetchall()}
         except psycopg2.Error as e:
             print("Error fetching record", str(e))
             return None
 
+    def allocate_uids(self, uid_requests: list):
+        """Allocates UIDs for (project1_id, project2_id, created) tuples in one round trip."""
+        project1_ids, project2_ids, created = zip(*uid_requests) if uid_requests else ((), (), ())
+        query = """
+                SELECT allocate_uid(p1, p2, created)
+                FROM unnest(%s::int[], %s::int[], %s::timestamp[]) WITH ORDINALITY AS t(p1, p2, created, n)
+                ORDER BY n
+                """
+        try:
+            self.__cursor.execute(query, (list(project1_ids), list(project2_ids), list(created)))
+            return [row[0] for row in self.__cursor.fetchall()]
+        except psycopg2.Error as e:
+            print("Error allocating UIDs", str(e))
+            return None
+
+    def reserve_uids(self, project1_id, project2_id, count: int, user_id: int):
+        """Reserves a block of UIDs for a project pair in one statement."""
+        query = """
+                INSERT INTO uidreservation (uid, project_id_1, project_id_2, reserved_by, reserved)
+                SELECT allocate_uid(%(project1_id)s, %(project2_id)s, %(reserved)s),
+                       %(project1_id)s, %(project2_id)s, %(user_id)s, %(reserved)s
+                FROM generate_series(1, %(count)s)
+                RETURNING uid
+                """
+        values = {
+            "project1_id": project1_id,
+            "project2_id": project2_id,
+            "user_id": user_id,
+            "count": count,
+            "reserved": datetime.now().replace(microsecond=0),
+        }
+        try:
+            self.__cursor.execute(query, values)
+            uids = [row[0] for row in self.__cursor.fetchall()]
+            self.__db.commit()
+            return sorted(uids, key=lambda uid: (len(uid), uid))
+        except psycopg2.Error as e:
+            print("Error reserving UIDs", str(e))
+            return None
+
+    def fetch_reserved_uids(self, uids: list):
+        """Fetches the project pair each of the given UIDs is reserved for, if it still is."""
+        try:
+            self.__cursor.execute(
+                "SELECT uid, project_id_1, project_id_2 FROM uidreservation WHERE uid = ANY(%s)", (uids,)
+            )
+            return {row[0]: (row[1], row[2]) for row in self.__cursor.fetchall()}
+        except psycopg2.Error as e:
+            print("Error fetching reserved UIDs", str(e))
+            return None
+
+    def copy_records(self, records: list):
+        """Loads fully populated records with COPY and commits them.
+
+        The reservations of records whose UID is reserved are claimed in the same transaction;
+        if any of them is no longer reserved for the record's projects, nothing is loaded.
+        """
+        reserved = [record for record in records if record.get("reserved")]
+        output = io.StringIO()
+        writer = csv.writer(output)
+        for record in records:
+            writer.writerow(
+                (
+                    record["user_id"],
+                    record["project1_id"],
+                    record["project2_id"],
+                    record["db_created"],
+                    record["record_name"],
+                    record["record_description"],
+                    record["data_location_type"],
+                    record["data_location"],
+                    "t" if record["invenio"] else "f",
+                    record["uid"],
+                )
+            )
+        output.seek(0)
+        try:
+            if reserved:
+                self.__cursor.execute(
+                    """
+                    DELETE FROM uidreservation r
+                    USING unnest(%s::varchar[], %s::int[], %s::int[]) AS c(uid, project_id_1, project_id_2)
+                    WHERE r.uid = c.uid AND r.project_id_1 = c.project_id_1 AND r.project_id_2 = c.project_id_2
+                    """,
+                    (
+                        [record["uid"] for record in reserved],
+                        [record["project1_id"] for record in reserved],
+                        [record["project2_id"] for record in reserved],
+                    ),
+                )
+                if self.__cursor.rowcount != len(reserved):
+                    print("Error copying records: reserved UIDs are no longer reserved")
+                    self.__db.rollback()
+                    return False
+            self.__cursor.copy_expert(
+                "COPY record (creator_id, project_id_1, project_id_2, created, record_name, record_description,"
+                " data_location_type, data_location, invenio, uid) FROM STDIN WITH (FORMAT csv)",
+                output,
+            )
+            self.__db.commit()
+            return True
+        except psycopg2.Error as e:
+            print("Error copying records", str(e))
+            self.__db.rollback()
+            return False
+
+    def insert_records(self, records: list):
+        """Inserts fully populated records one at a time and commits those the database accepts.
+
+        Returns the database error message for each record, None for inserted ones, or None if
+        the batch could not be processed at all.
+        """
+        query = """
+                INSERT INTO record (creator_id, project_id_1, project_id_2, created, record_name, record_description,
+                data_location_type, data_location, invenio, uid)
+                VALUES (%(user_id)s, %(project1_id)s, %(project2_id)s, %(db_created)s, %(record_name)s,
+                %(record_description)s, %(data_location_type)s, %(data_location)s, %(invenio)s, %(uid)s)
+                """
+        claim = """
+                DELETE FROM uidreservation
+                WHERE uid = %(uid)s AND project_id_1 = %(project1_id)s AND project_id_2 = %(project2_id)s
+                """
+        failures = []
+        try:
+            for record in records:
+                self.__cursor.execute("SAVEPOINT import_row")
+                try:
+                    if record.get("reserved"):
+                        self.__cursor.execute(claim, record)
+                        if self.__cursor.rowcount != 1:
+                            self.__cursor.execute("ROLLBACK TO SAVEPOINT import_row")
+                            failures.append(f"UID {record['uid']} is not reserved for these projects")
+                            continue
+                    self.__cursor.execute(query, record)
+                except psycopg2.Error as e:
+                    self.__cursor.execute("ROLLBACK TO SAVEPOINT import_row")
+                    failures.append(e.diag.message_primary or str(e).strip())
+                else:
+                    self.__cursor.execute("RELEASE SAVEPOINT import_row")
+                    failures.append(None)
+            self.__db.commit()
+            return failures
+        except psycopg2.Error as e:
+            print("Error inserting records", str(e))
+            self.__db.rollback()
+            return None
+
+    def fetch_project_record(self, user_id, filters: dict = None):
+        """Fetches records in the user's projects, one keyset page at a time when filters has a limit."""
+        return self.fetch_record_table(dict(filters or {}, visible_to=user_id))
+
     def update_record(self, record_info: dict, record_id: int):
         """Updates a record."""
         record_name = record_info["record_name"]
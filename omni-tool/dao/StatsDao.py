@@ -0,0 +1,90 @@
+"""
+This module provides a Stats DAO class for reading the record_summary aggregates.
+
+record_summary is maintained by triggers on record, which append delta rows that are now
+and then folded into one row per project, month, data_location_type and invenio status, so
+every query here sums the rows per key and its cost does not grow with the table size.
+"""
+import psycopg2
+from psycopg2.extensions import connection
+
+
+class Stats:
+    """Record statistics DAO."""
+
+    __db = None
+    __cursor = None
+
+    def __init__(self, db: connection):
+        self.__db = db
+        self.__cursor = self.__db.cursor()
+
+    @staticmethod
+    def __scope(project_id):
+        """Returns the WHERE clause and parameters for all records or one project's."""
+        if project_id is None:
+            return "is_primary", {}
+        return "project_id = %(project_id)s", {"project_id": project_id}
+
+    def fetch_totals(self, project_id=None):
+        """Fetches the number of records and how many of them are in Invenio."""
+        where, params = self.__scope(project_id)
+        try:
+            self.__cursor.execute(
+                f"SELECT COALESCE(SUM(records), 0) AS records,"
+                f" COALESCE(SUM(records) FILTER (WHERE invenio), 0) AS invenio"
+                f" FROM record_summary WHERE {where}",
+                params,
+            )
+            return self.__cursor.fetchone()
+        except psycopg2.Error as e:
+            print("Error fetching record totals: ", e)
+            return None
+
+    def fetch_project_counts(self):
+        """Fetches record counts per project, counting records under both of their projects."""
+        try:
+            self.__cursor.execute(
+                """
+                SELECT p.project_id, p.project_name, p.code, SUM(s.records) AS records,
+                       SUM(s.records) FILTER (WHERE s.invenio) AS invenio
+                FROM record_summary s
+                JOIN project p ON s.project_id = p.project_id
+                GROUP BY p.project_id, p.project_name, p.code
+                HAVING SUM(s.records) > 0
+                ORDER BY records DESC, p.project_name
+                """
+            )
+            return self.__cursor.fetchall()
+        except psycopg2.Error as e:
+            print("Error fetching project counts: ", e)
+            return None
+
+    def fetch_monthly_counts(self, project_id=None, months=24):
+        """Fetches record counts for the most recent months that have records."""
+        where, params = self.__scope(project_id)
+        try:
+            self.__cursor.execute(
+                f"SELECT month, SUM(records) AS records FROM record_summary WHERE {where}"
+                f" GROUP BY month HAVING SUM(records) > 0 ORDER BY month DESC LIMIT %(months)s",
+                dict(params, months=months),
+            )
+            return self.__cursor.fetchall()
+        except psycopg2.Error as e:
+            print("Error fetching monthly counts: ", e)
+            return None
+
+    def fetch_location_type_counts(self, project_id=None):
+        """Fetches record counts per data_location_type and invenio status."""
+        where, params = self.__scope(project_id)
+        try:
+            self.__cursor.execute(
+                f"SELECT data_location_type, invenio, SUM(records) AS records FROM record_summary"
+                f" WHERE {where} GROUP BY data_location_type, invenio HAVING SUM(records) > 0"
+                f" ORDER BY data_location_type, invenio",
+                params,
+            )
+            return self.__cursor.fetchall()
+        except psycopg2.Error as e:
+            print("Error fetching location type counts: ", e)
+            return None
@@ -5,6 +5,8 @@ import psycopg2
 from psycopg2.extensions import connection
 from werkzeug.security import generate_password_hash
 
+from app.cache import reference_cache
+
 
 class User:
     """User DAO."""
@@ -23,12 +25,13 @@ class User:
             query += " WHERE user_id = %s"
         query += " ORDER BY user_id"
         try:
-            self.__cursor.execute(query, str(user_id))
+            self.__cursor.execute(query, (user_id,) if user_id is not None else None)
             return self.__cursor.fetchall()
         except psycopg2.Error as e:
             print("Error fetching users: ", e)
             return None
 
+    @reference_cache.invalidates("users")
     def create_user(self, user_info):
         """Creates a new user."""
         email = user_info["email"]
@@ -57,6 +60,7 @@ class User:
             print("Error fetching user: ", e)
             return None
 
+    @reference_cache.cached("users")
     def fetch_user_emails(self):
         """Fetches all user emails from the database."""
         try:
@@ -66,6 +70,7 @@ class User:
             print("Error fetching users: ", e)
             return None
 
+    @reference_cache.invalidates("userprojects")
     def assign_project(self, user_id, project_id):
         """Assigns a project to a user."""
         try:
@@ -80,6 +85,7 @@ class User:
         except psycopg2.Error as e:
             print("Error assigning project: ", e)
 
+    @reference_cache.invalidates("userprojects")
     def unassign_project(self, user_id, project_id):
         """Unassigns a project from a user."""
         try:
@@ -91,6 +97,7 @@ class User:
         except psycopg2.Error as e:
             print("Error unassigning project: ", e)
 
+    @reference_cache.invalidates("users", "userprojects")
     def remove_user(self, user_id):
         """Removes a user."""
         try:
@@ -99,6 +106,7 @@ class User:
         except psycopg2.Error as e:
             print("Error removing user: ", e)
 
+    @reference_cache.invalidates("users")
     def update_user(self, user_info: dict, user_id: int):
         """Updates a user."""
         email = user_info["email"]
@@ -129,6 +137,7 @@ class User:
         except psycopg2.Error as e:
             print("Error updating user: ", e)
 
+    @reference_cache.cached("project", "userprojects")
     def fetch_user_projects(self, user_id: int):
         """Fetches user projects."""
         try:
@@ -136,13 +145,14 @@ class User:
                 "SELECT up.project_id, p.project_name, p.code"
                 " FROM userprojects up JOIN project p ON up.project_id=p.project_id"
                 " WHERE user_id=%s",
-                (str(user_id)),
+                (user_id,),
             )
             return self.__cursor.fetchall()
         except psycopg2.Error as e:
             print("Error fetching user projects: ", e)
             return None
 
+    @reference_cache.invalidates("users")
     def toggle_inactive_user(self, user_id: int):
         """Sets a user as inactive."""
         try:
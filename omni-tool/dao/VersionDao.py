@@ -0,0 +1,40 @@
+"""
+This module provides a TableVersion DAO class for reading per-table versions from the table_change log.
+"""
+import psycopg2
+from psycopg2.extensions import connection
+
+
+class TableVersion:
+    """Table version DAO."""
+
+    __db = None
+    __cursor = None
+
+    def __init__(self, db: connection):
+        self.__db = db
+        self.__cursor = self.__db.cursor()
+
+    def fetch_versions(self, tables):
+        """Fetches a version per table that grows with every committed write to it.
+
+        A version is the number of changes the table's log entries stand for; only committed
+        entries are visible, so a version never covers a write still in flight.
+        """
+        try:
+            self.__cursor.execute(
+                """
+                SELECT t.table_name, c.changes
+                FROM unnest(%s::varchar[]) AS t(table_name),
+                     LATERAL (SELECT sum(changes) AS changes
+                              FROM table_change
+                              WHERE table_name = t.table_name) AS c
+                """,
+                (list(tables),),
+            )
+            versions = {table: changes for table, changes in self.__cursor.fetchall() if changes is not None}
+            return tuple(versions.get(table) for table in tables)
+        except psycopg2.Error as e:
+            print("Error fetching table versions: ", e)
+            self.__db.rollback()
+            return None
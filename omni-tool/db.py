@@ -1,60 +1,182 @@
 """
 This module contains functions for handling database connections and initializing the application.
 """
+import functools
 import os
+import time
 
 import click
 import psycopg2
 import psycopg2.extras
-from flask import current_app, g, Flask
+from flask import current_app, g, has_request_context, session, Flask
 
+from app.cache import reference_cache
 from app.dao.ProjectDao import Project
 from app.dao.RecordDao import Record
+from app.dao.StatsDao import Stats
 from app.dao.UserDao import User
+from app.dao.VersionDao import TableVersion
+from app.importer import detect_format, import_records, read_rows
+from app.migrate import migrate, migration_status, stamp
+from app.pool import ConnectionPool
+from app.seed import seed_database
+
+
+def get_database_uri():
+    """Returns the database URI for the current environment."""
+    return os.getenv("DEV_DATABASE_URI") if os.environ.get("FLASK_ENV") == "development" \
+        else os.getenv("PROD_DATABASE_URI")
+
+
+def get_pool() -> ConnectionPool:
+    """Returns the connection pool of the current app."""
+    return current_app.extensions["db_pool"]
 
 
 def get_db():
-    """Returns a database connection object."""
+    """Returns a database connection checked out from the pool."""
     try:
         if "db" not in g:
-            db_uri = os.getenv("DEV_DATABASE_URI") if os.environ.get("FLASK_ENV") == "development" \
-                else os.getenv("PROD_DATABASE_URI")
-            g.db = psycopg2.connect(db_uri, cursor_factory=psycopg2.extras.DictCursor)
+            g.db = get_pool().checkout()
         return g.db
     except psycopg2.OperationalError as e:
         print("Error connecting to database: ", e)
     return g.db
 
 
-def load_dao():
-    """Load DAO objects."""
-    g.data_dao = Record(get_db())
+def get_replica_db():
+    """Returns a connection for read-only queries: the replica's, or the primary's as fallback."""
+    pool = current_app.extensions.get("db_replica_pool")
+    if pool is None or reads_pinned_to_primary():
+        return get_db()
+    try:
+        if "replica_db" not in g:
+            g.replica_db = pool.checkout()
+            if not g.replica_db.readonly:
+                g.replica_db.readonly = True
+        return g.replica_db
+    except psycopg2.OperationalError as e:
+        print("Error connecting to replica, reading from primary: ", e)
+    return get_db()
+
+
+def reads_pinned_to_primary():
+    """Check whether this request or the user's recent writes must be read from the primary."""
+    if g.get("db_wrote"):
+        return True
+    if not has_request_context():
+        return False
+    last_write = session.get("last_write")
+    return last_write is not None and time.time() - last_write < current_app.config["DB_REPLICA_STICKY_SECONDS"]
+
+
+def mark_write():
+    """Pin the rest of this request, and the user's next few seconds, to the primary."""
+    g.db_wrote = True
+    if has_request_context():
+        session["last_write"] = time.time()
+
+
+class RoutedDao:
+    """DAO proxy that sends read-only methods to the replica and everything else to the primary.
+
+    Each side's DAO is built on first use, so a request that only reads never checks out a
+    primary connection.
+    """
+
+    READ_METHOD_PREFIXES = ("fetch_", "check_", "stream_")
+
+    def __init__(self, dao_class):
+        self.__dao_class = dao_class
+        self.__primary = None
+        self.__replica = None
+
+    def __getattr__(self, name):
+        if name.startswith(self.READ_METHOD_PREFIXES):
+            if reads_pinned_to_primary():
+                return getattr(self.__primary_dao(), name)
+            if self.__replica is None:
+                self.__replica = self.__dao_class(get_replica_db())
+            return getattr(self.__replica, name)
+        mark_write()
+        return getattr(self.__primary_dao(), name)
+
+    def __primary_dao(self):
+        if self.__primary is None:
+            self.__primary = self.__dao_class(get_db())
+        return self.__primary
+
+
+def get_dao(key, dao_class):
+    """Returns the request's DAO of a class, creating it on first use."""
+    if key not in g:
+        if "db_replica_pool" in current_app.extensions:
+            setattr(g, key, RoutedDao(dao_class))
+        else:
+            setattr(g, key, dao_class(get_db()))
+    return g.get(key)
 
 
 def get_recorddao():
-    """Get Record DAO objects"""
-    g.data_dao = Record(get_db())
-    return g.data_dao
+    """Get the request's Record DAO, creating it on first use"""
+    prepare_statements = current_app.config.get("DB_PREPARED_STATEMENTS", True)
+    return get_dao("record_dao", functools.partial(Record, prepare_statements=prepare_statements))
 
 
 def get_projectdao():
-    """Get project DAO objects"""
-    g.project_dao = Project(get_db())
-    return g.project_dao
+    """Get the request's project DAO, creating it on first use"""
+    return get_dao("project_dao", Project)
 
 
 def get_userdao():
-    """Get user DAO object"""
-    g.user_dao = User(get_db())
-    return g.user_dao
+    """Get the request's user DAO, creating it on first use"""
+    return get_dao("user_dao", User)
+
+
+def get_statsdao():
+    """Get the request's statistics DAO, creating it on first use"""
+    return get_dao("stats_dao", Stats)
+
+
+def get_versiondao():
+    """Get the request's table version DAO, creating it on first use"""
+    return get_dao("version_dao", TableVersion)
+
+
+# Tables whose shared versions key the per-worker caches
+CACHED_TABLES = ("project", "users", "userprojects")
+
+
+def get_table_versions(tables):
+    """Returns the versions all workers share for the given tables, read once per request.
+
+    The first call reads CACHED_TABLES along with the tables asked for, so the ETag and the
+    per-worker caches of a request share one query. Returns None outside a request or when
+    the versions cannot be read, so callers skip caching.
+    """
+    if not has_request_context():
+        return None
+    known = g.setdefault("table_versions", {})
+    missing = tuple(table for table in dict.fromkeys((*tables, *CACHED_TABLES)) if table not in known)
+    if missing:
+        versions = get_versiondao().fetch_versions(missing)
+        known.update(zip(missing, versions or (None,) * len(missing)))
+    versions = tuple(known[table] for table in tables)
+    return None if None in versions else versions
 
 
 def close_db(_=None):
-    """Close Db connection."""
+    """Return the Db connection to the pool."""
+    # The DAOs hold cursors on the connection, so they go with it
+    for dao in ("record_dao", "project_dao", "user_dao", "stats_dao", "version_dao"):
+        g.pop(dao, None)
     db = g.pop("db", None)
+    replica_db = g.pop("replica_db", None)
 
     if db is not None:
-        db.close()
+        get_pool().checkin(db)
+    if replica_db is not None:
+        current_app.extensions["db_replica_pool"].checkin(replica_db)
 
 
 def init_db():
@@ -69,6 +191,7 @@ def init_db():
 
         cursor.execute(sql)
         db.commit()
+        stamp(db)
 
         users = [
             {
@@ -103,9 +226,29 @@ def init_db():
 
 def init_app(app: Flask):
     """Initialize the application."""
+    app.extensions["db_pool"] = ConnectionPool(
+        get_database_uri(),
+        min_size=app.config.get("DB_POOL_MIN_SIZE", 1),
+        max_size=app.config.get("DB_POOL_MAX_SIZE", 10),
+        timeout=app.config.get("DB_POOL_TIMEOUT", 5.0),
+        max_lifetime=app.config.get("DB_POOL_MAX_LIFETIME", 1800.0),
+        cursor_factory=psycopg2.extras.DictCursor,
+    )
+    if app.config.get("DB_REPLICA_URI"):
+        app.extensions["db_replica_pool"] = ConnectionPool(
+            app.config["DB_REPLICA_URI"],
+            min_size=app.config.get("DB_POOL_MIN_SIZE", 1),
+            max_size=app.config.get("DB_POOL_MAX_SIZE", 10),
+            timeout=app.config.get("DB_POOL_TIMEOUT", 5.0),
+            max_lifetime=app.config.get("DB_POOL_MAX_LIFETIME", 1800.0),
+            cursor_factory=psycopg2.extras.DictCursor,
+        )
+    reference_cache.shared_versions = get_table_versions
     app.teardown_appcontext(close_db)
     app.cli.add_command(init_db_command)
-    app.before_request(load_dao)
+    app.cli.add_command(migrate_db_command)
+    app.cli.add_command(import_records_command)
+    app.cli.add_command(seed_command)
 
 
 @click.command("init-db")
@@ -113,3 +256,75 @@ def init_db_command():
     """Clear existing record and create new table"""
     init_db()
     click.echo("Initialized the database")
+
+
+@click.command("migrate-db")
+@click.option("--status", is_flag=True, help="List migrations without applying them.")
+def migrate_db_command(status):
+    """Apply pending schema migrations in place"""
+    db = get_db()
+    if status:
+        for version, name, applied in migration_status(db):
+            click.echo(f"{version:04d} {name}: {'applied' if applied else 'pending'}")
+        return
+
+    try:
+        applied = migrate(db)
+    except psycopg2.Error as e:
+        raise click.ClickException(f"Migration failed: {e}")
+
+    for version, name in applied:
+        click.echo(f"Applied {version:04d} {name}")
+    click.echo(f"Database is up to date ({len(applied)} migrations applied)")
+
+
+@click.command("import-records")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--creator", required=True, help="Email of the user credited for rows without a creator.")
+@click.option("--batch-size", type=int, help="Rows validated and copied per batch [default: RECORD_IMPORT_BATCH_SIZE].")
+def import_records_command(path, creator, batch_size):
+    """Bulk import records from a CSV or JSON Lines file"""
+    user = get_userdao().fetch_user_by_email(creator)
+    if user is None:
+        raise click.ClickException(f"No user with email {creator}")
+
+    with open(path, encoding="utf-8-sig", newline="") as stream:
+        result = import_records(
+            read_rows(stream, detect_format(path)),
+            get_recorddao(),
+            get_projectdao(),
+            get_userdao(),
+            user["user_id"],
+            batch_size=batch_size or current_app.config["RECORD_IMPORT_BATCH_SIZE"],
+        )
+
+    for line, message in result["errors"]:
+        click.echo(f"line {line}: {message}", err=True)
+    click.echo(f"Imported {result['imported']} records, rejected {len(result['errors'])} rows")
+
+
+@click.command("seed")
+@click.option("--users", default=50, show_default=True, help="Users to create.")
+@click.option("--projects", default=20, show_default=True, help="Projects to create.")
+@click.option("--records", default=10000, show_default=True, help="Records to create.")
+@click.option("--seed", default=0, show_default=True, help="Random seed; the same seed yields the same data.")
+@click.option("--batch-size", default=10000, show_default=True, help="Records copied per batch.")
+def seed_command(users, projects, records, seed, batch_size):
+    """Generate synthetic users, projects and records for load testing"""
+    if users < 1 or projects < 1:
+        raise click.ClickException("Need at least one user and one project")
+
+    try:
+        created = seed_database(
+            get_db(),
+            users=users,
+            projects=projects,
+            records=records,
+            seed=seed,
+            batch_size=batch_size,
+            progress=lambda count: click.echo(f"Copied {count} of {records} records"),
+        )
+    except (ValueError, RuntimeError, psycopg2.Error) as e:
+        raise click.ClickException(f"Seeding failed: {e}")
+
+    click.echo(f"Created {created['users']} users, {created['projects']} projects and {created['records']} records")
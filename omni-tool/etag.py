@@ -0,0 +1,86 @@
+"""
+This module answers conditional GETs for the htmx fragments with 304 Not Modified.
+
+ETags are derived from the versions of the tables a fragment reads (from the table_change
+log that statement triggers append to, read once per request by db.get_table_versions), the
+URL, the viewer and a fingerprint of the deployed code and templates. Revalidating therefore
+costs one index scan and no rendering.
+Responses are marked "private, no-cache" so browsers always revalidate before reuse; the
+viewer is part of the ETag, so a cached copy is never served across logins.
+"""
+import functools
+import hashlib
+import os
+
+from flask import Flask, current_app, g, make_response, request, session
+
+from app.db import get_table_versions
+
+
+def deploy_fingerprint(app: Flask):
+    """Returns a token that changes whenever the code or templates are redeployed."""
+    latest = 0.0
+    for root, _, files in os.walk(app.root_path):
+        for filename in files:
+            if filename.endswith((".py", ".html")):
+                latest = max(latest, os.path.getmtime(os.path.join(root, filename)))
+    return str(int(latest))
+
+
+def compute_etag(*tables):
+    """Returns the ETag of the current request's response, or None if it cannot be derived."""
+    if not current_app.config.get("CONDITIONAL_REQUESTS"):
+        return None
+    versions = get_table_versions(tables)
+    if versions is None:
+        return None
+    key = (
+        current_app.config["ETAG_SALT"],
+        request.full_path,
+        session.get("user_id"),
+        g.get("user_role"),
+        versions,
+    )
+    return hashlib.sha1(repr(key).encode()).hexdigest()[:24]
+
+
+def not_modified(etag):
+    """Returns a 304 response if the client already holds etag, otherwise None."""
+    if etag is None or request.method not in ("GET", "HEAD"):
+        return None
+    # Weak comparison: compressed responses carry the ETag as W/"..."
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    return tag(make_response("", 304), etag)
+
+
+def tag(response, etag):
+    """Attaches an ETag and revalidation headers to a response."""
+    if etag is not None and response.status_code in (200, 304):
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def conditional(*tables):
+    """Decorates a GET view so it answers 304 while the given tables are unchanged."""
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapped(*args, **kwargs):
+            etag = compute_etag(*tables)
+            response = not_modified(etag)
+            if response is None:
+                response = tag(make_response(view(*args, **kwargs)), etag)
+            return response
+
+        return wrapped
+
+    return decorator
+
+
+def init_app(app: Flask):
+    """Fix the ETag salt for this deployment."""
+    app.config.setdefault("ETAG_SALT", None)
+    if not app.config["ETAG_SALT"]:
+        app.config["ETAG_SALT"] = deploy_fingerprint(app)
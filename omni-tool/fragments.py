@@ -0,0 +1,51 @@
+"""
+This module renders table rows through the fragment cache.
+
+A row is keyed by its template and a digest of the values it is rendered from, so the
+digest acts as the row version: an edited row gets a new key and is rendered again, while
+unchanged rows reuse the HTML rendered for an earlier request or table refresh. Stale
+entries are never read again and fall out of the LRU once FRAGMENT_CACHE_BYTES is reached.
+Row templates must only depend on their arguments, never on the request or the session.
+"""
+import hashlib
+
+from flask import Flask, current_app
+from markupsafe import Markup
+
+from app.cache import fragment_cache
+from app.instrumentation import timed_render
+
+
+def freeze(value):
+    """Returns a representation of a row value that only changes when its content does."""
+    if hasattr(value, "items"):
+        return tuple((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def render_fragment(template_name, **context):
+    """Renders a row template, reusing the cached HTML when the row is unchanged."""
+    with timed_render():
+        return _render_fragment(template_name, context)
+
+
+def _render_fragment(template_name, context):
+    template = current_app.jinja_env.get_or_select_template(template_name)
+    if not fragment_cache.maxbytes:
+        return Markup(template.render(**context))
+
+    values = repr(sorted((name, freeze(value)) for name, value in context.items()))
+    # The template object is part of the key so reloaded templates are rendered again
+    key = (template, hashlib.sha1(values.encode()).digest())
+    html = fragment_cache.get(key)
+    if html is None:
+        html = Markup(template.render(**context))
+        fragment_cache.set(key, html)
+    return html
+
+
+def init_app(app: Flask):
+    """Make render_fragment available to templates."""
+    app.add_template_global(render_fragment)
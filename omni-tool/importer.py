@@ -0,0 +1,249 @@
+"""
+This module provides bulk record import from CSV and JSON Lines files.
+
+Rows are validated in batches. Project codes and creator emails are resolved once per
+import. Each batch gets its UIDs from a single allocation query, except rows that name a
+reserved UID, and is loaded with COPY in the transaction that claims those reservations;
+if the database rejects the COPY, the batch is inserted row by row to report the failing lines.
+
+Columns (CSV header or JSON keys):
+- record_name, record_description, data_location_type, data_location, project1 : required
+- project2 : second project code, defaults to the empty "XX" project
+- invenio : true/false, defaults to false
+- created : ISO date or datetime, defaults to the time of import
+- creator : creator email, defaults to the importing user
+- uid : a UID reserved for the row's projects (see /record/reserve), defaults to a new one
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from itertools import islice
+
+DATA_LOCATION_TYPES = ("local", "coastal6", "other")
+REQUIRED_FIELDS = ("record_name", "record_description", "data_location_type", "data_location", "project1")
+MAX_FIELD_LENGTH = 255
+MAX_UID_LENGTH = 32
+TRUE_VALUES = ("true", "t", "yes", "y", "1")
+FALSE_VALUES = ("false", "f", "no", "n", "0", "")
+
+
+def read_rows(stream, file_format):
+    """Yields (line number, row dict) pairs from a text stream of CSV or JSON Lines.
+
+    A file that cannot be decoded or parsed ends with one error row for the line it failed on.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(stream)
+        try:
+            for row in reader:
+                yield reader.line_num, row
+        except UnicodeDecodeError:
+            yield reader.line_num + 1, {"__error__": "File is not UTF-8 text; stopped reading"}
+        except csv.Error as e:
+            yield reader.line_num, {"__error__": f"Malformed CSV: {e}; stopped reading"}
+    elif file_format == "jsonl":
+        line_number = 0
+        try:
+            for line_number, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, {"__error__": f"Invalid JSON: {e.msg}"}
+                    continue
+                yield line_number, row if isinstance(row, dict) else {"__error__": "Expected a JSON object"}
+        except UnicodeDecodeError:
+            yield line_number + 1, {"__error__": "File is not UTF-8 text; stopped reading"}
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+
+def detect_format(filename):
+    """Guesses the import format from a file name."""
+    return "jsonl" if (filename or "").lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+
+def open_upload(file_storage):
+    """Returns a text stream and format for an uploaded import file."""
+    stream = io.TextIOWrapper(file_storage.stream, encoding="utf-8-sig", newline="")
+    return stream, detect_format(file_storage.filename)
+
+
+def parse_created(value, default):
+    """Parses an optional ISO date or datetime."""
+    if value in (None, ""):
+        return default
+    created = datetime.fromisoformat(str(value).strip())
+    return created.replace(tzinfo=None)
+
+
+def parse_invenio(value):
+    """Parses an optional boolean invenio flag."""
+    if isinstance(value, bool):
+        return value
+    value = str(value if value is not None else "").strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f"invenio must be true or false, got '{value}'")
+
+
+def validate_row(row, project_ids, creator_ids, default_creator_id, imported_at):
+    """Turns a raw import row into record_info, raising ValueError on invalid input."""
+    if "__error__" in row:
+        raise ValueError(row["__error__"])
+
+    row = {key.strip().lower(): value for key, value in row.items() if key is not None}
+    values = {key: str(row.get(key) or "").strip() for key in REQUIRED_FIELDS}
+    missing = [key for key, value in values.items() if value == ""]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    too_long = [key for key, value in values.items() if len(value) > MAX_FIELD_LENGTH]
+    if too_long:
+        raise ValueError(f"{', '.join(too_long)} longer than {MAX_FIELD_LENGTH} characters")
+
+    data_location_type = values["data_location_type"].lower()
+    if data_location_type not in DATA_LOCATION_TYPES:
+        raise ValueError(f"data_location_type must be one of {', '.join(DATA_LOCATION_TYPES)}")
+
+    project1_code = values["project1"].upper()
+    project2_code = str(row.get("project2") or "XX").strip().upper()
+    for code in (project1_code, project2_code):
+        if code not in project_ids:
+            raise ValueError(f"Unknown project code '{code}'")
+        if project_ids[code] is None:
+            raise ValueError(f"Project code '{code}' is shared by several projects")
+    project1_id = project_ids[project1_code]
+    project2_id = project_ids[project2_code]
+    if project2_id == project1_id:
+        project2_id = project_ids["XX"]
+
+    creator = str(row.get("creator") or "").strip()
+    if creator and creator not in creator_ids:
+        raise ValueError(f"Unknown creator '{creator}'")
+
+    reserved_uid = str(row.get("uid") or "").strip()
+    if len(reserved_uid) > MAX_UID_LENGTH:
+        raise ValueError(f"uid longer than {MAX_UID_LENGTH} characters")
+
+    return {
+        "user_id": creator_ids[creator] if creator else default_creator_id,
+        "record_name": values["record_name"],
+        "project1_id": project1_id,
+        "project2_id": project2_id,
+        "record_description": values["record_description"],
+        "invenio": parse_invenio(row.get("invenio")),
+        "data_location_type": data_location_type,
+        "data_location": values["data_location"],
+        "db_created": parse_created(row.get("created"), imported_at),
+        "uid": reserved_uid or None,
+        "reserved": bool(reserved_uid),
+    }
+
+
+def map_project_codes(projects):
+    """Maps project codes to ids; codes used by several projects map to None."""
+    project_ids = {}
+    for project in projects:
+        code = project["code"].strip().upper()
+        project_ids[code] = None if code in project_ids else project["project_id"]
+    return project_ids
+
+
+def check_reservations(record_dao, records, errors):
+    """Returns the records whose reserved UID, if any, is reserved for their projects."""
+    reserved_uids = [info["uid"] for _, info in records if info["reserved"]]
+    if not reserved_uids:
+        return records
+    reservations = record_dao.fetch_reserved_uids(reserved_uids)
+    if reservations is None:
+        errors.extend((line, "Could not check reserved UIDs") for line, info in records if info["reserved"])
+        return [(line, info) for line, info in records if not info["reserved"]]
+
+    checked = []
+    for line, info in records:
+        # Popped, so a UID named twice in the file is only claimed by its first row
+        if info["reserved"] and reservations.pop(info["uid"], None) != (info["project1_id"], info["project2_id"]):
+            errors.append((line, f"UID '{info['uid']}' is not reserved for these projects"))
+        else:
+            checked.append((line, info))
+    return checked
+
+
+def import_batch(record_dao, batch, errors):
+    """Validates name uniqueness and reserved UIDs, allocates UIDs and copies one batch. Returns rows loaded."""
+    existing = record_dao.fetch_existing_record_names([info["record_name"] for _, info in batch])
+    if existing is None:
+        errors.extend((line, "Could not check record names") for line, _ in batch)
+        return 0
+
+    records = []
+    for line, info in batch:
+        if info["record_name"] in existing:
+            errors.append((line, f"Record name '{info['record_name']}' already exists"))
+        else:
+            records.append((line, info))
+    records = check_reservations(record_dao, records, errors)
+    if not records:
+        return 0
+
+    unassigned = [info for _, info in records if not info["reserved"]]
+    if unassigned:
+        uids = record_dao.allocate_uids(
+            [(info["project1_id"], info["project2_id"], info["db_created"]) for info in unassigned]
+        )
+        if uids is None:
+            errors.extend((line, "Could not allocate UIDs") for line, _ in records)
+            return 0
+        for info, uid in zip(unassigned, uids):
+            info["uid"] = uid
+
+    if record_dao.copy_records([info for _, info in records]):
+        return len(records)
+
+    # One bad row rejects the whole COPY; insert row by row to load the rest and name the culprit
+    failures = record_dao.insert_records([info for _, info in records])
+    if failures is None:
+        errors.extend((line, "Batch rejected by the database") for line, _ in records)
+        return 0
+    for (line, _), failure in zip(records, failures):
+        if failure is not None:
+            errors.append((line, f"Rejected by the database: {failure}"))
+    return failures.count(None)
+
+
+def import_records(rows, record_dao, project_dao, user_dao, default_creator_id, batch_size=1000):
+    """Imports (line number, row) pairs and reports how many loaded and which lines failed."""
+    project_ids = map_project_codes(project_dao.fetch_projects() or [])
+    creator_ids = {user["email"]: user["user_id"] for user in user_dao.fetch_user() or []}
+    imported_at = datetime.now().replace(microsecond=0)
+
+    imported = 0
+    errors = []
+    seen_names = set()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if not chunk:
+            break
+
+        batch = []
+        for line, row in chunk:
+            try:
+                info = validate_row(row, project_ids, creator_ids, default_creator_id, imported_at)
+            except (ValueError, TypeError, AttributeError) as e:
+                errors.append((line, str(e)))
+                continue
+            if info["record_name"] in seen_names:
+                errors.append((line, f"Duplicate record name '{info['record_name']}' in file"))
+                continue
+            seen_names.add(info["record_name"])
+            batch.append((line, info))
+
+        if batch:
+            imported += import_batch(record_dao, batch, errors)
+
+    return {"imported": imported, "errors": errors}
@@ -0,0 +1,178 @@
+"""
+This module provides optional per-request query instrumentation.
+
+When QUERY_INSTRUMENTATION is enabled the pool hands out connections whose cursors time
+every statement. Each request collects its query count and database time in g, statements
+slower than SLOW_QUERY_MS are logged with their normalized SQL, failed statements are logged
+before the DAOs swallow the error, and every response gets a Server-Timing header with db,
+render and total durations. Render time covers render_template and render_fragment, which
+renders without template signals. Compression runs after this header is added, so total
+leaves it out; buffered responses report it in a separate compress entry, while streamed
+responses are compressed as they are sent and cannot report it. EXECUTEs of prepared
+record queries are logged as the query they were prepared from. When disabled nothing is
+registered and the plain DictCursor is used.
+"""
+import logging
+import re
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extras
+from flask import Flask, current_app, g, has_app_context, request, before_render_template, template_rendered
+
+from app.dao.RecordDao import prepared_query
+
+logger = logging.getLogger(__name__)
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+REPEATED_GROUP = re.compile(r"(\([^()]*\))(?:\s*,\s*\1)+")
+WHITESPACE = re.compile(r"\s+")
+EXECUTE_PREPARED = re.compile(r"\bEXECUTE\s+(\w+)")
+
+# Statements kept per request for debug logging
+MAX_STATEMENTS = 200
+
+
+def describe_statement(query):
+    """Returns the SQL a statement runs, looking through EXECUTE of a prepared record query."""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    match = EXECUTE_PREPARED.search(str(query))
+    if match:
+        original = prepared_query(match.group(1))
+        if original is not None:
+            return original
+    return query
+
+
+def normalize_sql(query):
+    """Collapses a statement to its shape: literals become ?, repeated value rows collapse."""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    query = STRING_LITERAL.sub("?", str(query))
+    query = NUMBER_LITERAL.sub("?", query)
+    query = WHITESPACE.sub(" ", query).strip()
+    return REPEATED_GROUP.sub(r"\1, ...", query)
+
+
+def get_query_stats():
+    """Returns the query statistics of the current request, or None outside an app context."""
+    if not has_app_context():
+        return None
+    if "query_stats" not in g:
+        g.query_stats = {"count": 0, "time": 0.0, "statements": []}
+    return g.query_stats
+
+
+def record_statement(query, elapsed, slow_threshold):
+    """Adds a timed statement to the request statistics and logs it if slow."""
+    stats = get_query_stats()
+    if stats is not None:
+        stats["count"] += 1
+        stats["time"] += elapsed
+        if len(stats["statements"]) < MAX_STATEMENTS:
+            stats["statements"].append((query, elapsed))
+    if slow_threshold is not None and elapsed * 1000 >= slow_threshold:
+        logger.warning("Slow query (%.1f ms): %s", elapsed * 1000, normalize_sql(query))
+
+
+class InstrumentedCursor(psycopg2.extras.DictCursor):
+    """DictCursor that times the statements it sends."""
+
+    # Milliseconds after which a statement is logged, set by init_app
+    slow_threshold = None
+
+    def _timed(self, query, run):
+        query = describe_statement(query)
+        started = time.perf_counter()
+        try:
+            return run()
+        except psycopg2.Error as e:
+            logger.warning("Query failed: %s (%s)", normalize_sql(query), str(e).strip())
+            raise
+        finally:
+            record_statement(query, time.perf_counter() - started, self.slow_threshold)
+
+    def execute(self, query, vars=None):
+        return self._timed(query, lambda: super(InstrumentedCursor, self).execute(query, vars))
+
+    def executemany(self, query, vars_list):
+        return self._timed(query, lambda: super(InstrumentedCursor, self).executemany(query, vars_list))
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._timed(sql, lambda: super(InstrumentedCursor, self).copy_expert(sql, file, size))
+
+    def fetchmany(self, size=None):
+        # Server-side (named) cursors make a round trip per fetch
+        if self.name is None:
+            return super().fetchmany(size)
+        return self._timed(f"FETCH FROM {self.name}", lambda: super(InstrumentedCursor, self).fetchmany(size))
+
+
+def start_timer():
+    """Marks the start of a request."""
+    g.request_started = time.perf_counter()
+
+
+def start_render(_app, template, **_):
+    """Marks the start of a template render."""
+    g.setdefault("render_started", []).append(time.perf_counter())
+
+
+def finish_render(_app, template, **_):
+    """Adds a finished outermost render to the request's render time."""
+    started = g.get("render_started")
+    if started:
+        render_started = started.pop()
+        # Nested renders are already part of the enclosing one
+        if not started:
+            g.render_time = g.get("render_time", 0.0) + time.perf_counter() - render_started
+
+
+@contextmanager
+def timed_render():
+    """Counts a render that sends no template signals towards the request's render time."""
+    if not has_app_context() or not current_app.config.get("QUERY_INSTRUMENTATION"):
+        yield
+        return
+    start_render(None, None)
+    try:
+        yield
+    finally:
+        finish_render(None, None)
+
+
+def add_server_timing(response):
+    """Adds db, render and total durations to the response."""
+    stats = get_query_stats()
+    render_time = g.get("render_time", 0.0)
+    total = time.perf_counter() - g.get("request_started", time.perf_counter())
+    response.headers.add(
+        "Server-Timing",
+        f'db;dur={stats["time"] * 1000:.1f};desc="{stats["count"]} queries", '
+        f"render;dur={render_time * 1000:.1f}, total;dur={total * 1000:.1f}",
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "%s %s: %d queries, %.1f ms db, %.1f ms total",
+            request.method, request.path, stats["count"], stats["time"] * 1000, total * 1000,
+        )
+        for query, elapsed in stats["statements"]:
+            logger.debug("  %.1f ms %s", elapsed * 1000, normalize_sql(query))
+    return response
+
+
+def init_app(app: Flask):
+    """Enable instrumentation if QUERY_INSTRUMENTATION is set. Call after db.init_app."""
+    if not app.config.get("QUERY_INSTRUMENTATION"):
+        return
+    InstrumentedCursor.slow_threshold = app.config.get("SLOW_QUERY_MS")
+    for pool in ("db_pool", "db_replica_pool"):
+        if pool in app.extensions:
+            app.extensions[pool].cursor_factory = InstrumentedCursor
+    app.before_request(start_timer)
+    app.after_request(add_server_timing)
+    before_render_template.connect(start_render, app)
+    template_rendered.connect(finish_render, app)
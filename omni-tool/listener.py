@@ -0,0 +1,105 @@
+"""
+This module keeps per-worker versions of rarely written tables current from PostgreSQL
+notifications, so caches keyed by them can be checked without a query per request.
+
+bump_table_version() sends a NOTIFY on the table_change channel for every table except
+record. NOTIFY serializes committing transactions, and records are written far too often
+for that. Each worker runs a daemon thread that LISTENs on a connection of its own and
+counts the notifications per table. Notifications are delivered when the writing
+transaction commits, so a version moves within moments of any worker's write. The thread
+is started on the first request of each worker process, so neither a gunicorn master nor
+CLI commands start one. While it is not listening, versions are unknown (None) and callers
+read the database instead. Notifications sent while it was away are lost, so every
+reconnect starts a new epoch.
+"""
+import os
+import select
+import threading
+import time
+
+import psycopg2
+from flask import Flask
+
+from app.db import get_database_uri
+
+CHANNEL = "table_change"
+
+
+class TableListener:
+    """Counts table_change notifications per table in a background thread."""
+
+    def __init__(self, dsn=None, retry_interval=5.0, ping_interval=30.0):
+        self.dsn = dsn
+        self.retry_interval = retry_interval
+        self.ping_interval = ping_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._listening = False
+        self._epoch = 0
+        self._counters = {}
+
+    def start(self):
+        """Starts this process's listener thread unless it is already running."""
+        if self.dsn is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A thread inherited through fork does not run in the child
+            self._pid = os.getpid()
+            self._listening = False
+        threading.Thread(target=self.run, name="table-listener", daemon=True).start()
+
+    def versions(self, tables):
+        """Returns this worker's versions of the given tables, or None while not listening."""
+        with self._lock:
+            if not self._listening or self._pid != os.getpid():
+                return None
+            return self._epoch, tuple(self._counters.get(table, 0) for table in tables)
+
+    def run(self):
+        """Listens until the process exits, reconnecting after errors."""
+        while True:
+            try:
+                self.listen()
+            except psycopg2.Error as e:
+                print("Error listening for table changes: ", e)
+            with self._lock:
+                self._listening = False
+            time.sleep(self.retry_interval)
+
+    def listen(self):
+        """Counts notifications on one connection until it fails."""
+        db = psycopg2.connect(self.dsn)
+        try:
+            db.autocommit = True
+            cursor = db.cursor()
+            cursor.execute(f"LISTEN {CHANNEL}")
+            with self._lock:
+                self._epoch += 1
+                self._counters = {}
+                self._listening = True
+            while True:
+                if select.select([db], [], [], self.ping_interval) == ([], [], []):
+                    # A silent connection may be dead; a query finds out
+                    cursor.execute("SELECT 1")
+                    continue
+                db.poll()
+                with self._lock:
+                    for notify in db.notifies:
+                        self._counters[notify.payload] = self._counters.get(notify.payload, 0) + 1
+                db.notifies.clear()
+        finally:
+            db.close()
+
+
+# Versions of project, users and userprojects as this worker last heard of them
+table_listener = TableListener()
+
+
+def init_app(app: Flask):
+    """Listen for table changes in each worker if DB_NOTIFICATIONS is set."""
+    if not app.config.get("DB_NOTIFICATIONS"):
+        return
+    table_listener.dsn = get_database_uri()
+    app.before_request(table_listener.start)
@@ -0,0 +1,153 @@
+"""
+This module exposes request and database statistics in the Prometheus text format.
+
+Routes:
+- /metrics : GET, scraped by Prometheus
+
+The endpoint is only registered when METRICS_ENABLED is set. Scrapers then authenticate with
+METRICS_TOKEN as a bearer token; without a token only localhost may scrape.
+
+With several workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory shared by them
+before the server starts (gunicorn.conf.py clears it and cleans up after exited workers);
+each scrape then aggregates every worker. Without it only the serving process is reported.
+
+Pool and cache numbers are kept by each worker, so they are copied into the metrics at the
+end of every request that worker serves. Cache hit ratios are computed at query time, e.g.
+rate(uid_cache_hits_total[5m]) / (rate(uid_cache_hits_total[5m]) + rate(uid_cache_misses_total[5m])).
+"""
+import hmac
+import os
+import time
+
+from flask import Blueprint, Flask, Response, abort, current_app, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from app.cache import fragment_cache, identity_cache, reference_cache
+
+bp = Blueprint("metrics", __name__)
+
+REQUESTS = Counter(
+    "uid_http_requests_total", "HTTP requests served.", ["endpoint", "method", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "uid_http_request_duration_seconds",
+    "Time spent handling HTTP requests.",
+    ["endpoint"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+POOL_CONNECTIONS = Gauge(
+    "uid_db_pool_connections", "Pooled database connections.", ["state"], multiprocess_mode="livesum"
+)
+POOL_EVENTS = Counter(
+    "uid_db_pool_events_total", "Connection pool events.", ["event"]
+)
+POOL_WAIT = Counter(
+    "uid_db_pool_wait_seconds_total", "Time spent waiting for a pooled connection."
+)
+CACHE_HITS = Counter("uid_cache_hits_total", "In-process cache hits.", ["cache"])
+CACHE_MISSES = Counter("uid_cache_misses_total", "In-process cache misses.", ["cache"])
+UIDS_ALLOCATED = Counter("uid_uids_allocated_total", "UIDs allocated.", ["source"])
+
+POOL_EVENT_COUNTERS = ("checkouts", "waits", "timeouts", "connections_opened", "connections_recycled")
+
+# Clients allowed to scrape when no METRICS_TOKEN is set
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+CACHES = {"identity": identity_cache, "reference": reference_cache, "fragment": fragment_cache}
+
+# Last pool and cache counters copied by this process, keyed by pid so a fork starts over
+_copied = {}
+
+
+def count_uids(source, count=1):
+    """Counts UIDs allocated for records or reservations."""
+    UIDS_ALLOCATED.labels(source).inc(count)
+
+
+def copy_counters(key, value, counter):
+    """Advances a metric by how much a cumulative counter grew since the last copy."""
+    last = _copied.get(key, 0)
+    if value > last:
+        counter.inc(value - last)
+    _copied[key] = value
+
+
+def collect_runtime_stats():
+    """Copies this worker's pool and cache statistics into the metrics."""
+    pid = os.getpid()
+    if _copied.get("pid") != pid:
+        _copied.clear()
+        _copied["pid"] = pid
+
+    stats = current_app.extensions["db_pool"].stats()
+    POOL_CONNECTIONS.labels("in_use").set(stats["in_use"])
+    POOL_CONNECTIONS.labels("idle").set(stats["idle"])
+    POOL_CONNECTIONS.labels("max").set(stats["max_size"])
+    for event in POOL_EVENT_COUNTERS:
+        copy_counters(event, stats[event], POOL_EVENTS.labels(event))
+    copy_counters("wait_time_total", stats["wait_time_total"], POOL_WAIT)
+
+    for name, cache in CACHES.items():
+        cache_stats = cache.stats()
+        copy_counters(f"{name}_hits", cache_stats["hits"], CACHE_HITS.labels(name))
+        copy_counters(f"{name}_misses", cache_stats["misses"], CACHE_MISSES.labels(name))
+
+
+def start_timer():
+    """Marks the start of a request."""
+    g.metrics_started = time.perf_counter()
+
+
+def observe_request(response):
+    """Counts a finished request and records its latency."""
+    if request.endpoint == "metrics.export":
+        return response
+    endpoint = request.endpoint or "unmatched"
+    REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+    started = g.get("metrics_started")
+    if started is not None:
+        REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+    collect_runtime_stats()
+    return response
+
+
+@bp.route("/metrics")
+def export():
+    """Returns the metrics of every worker in the Prometheus text format."""
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            abort(403)
+    elif request.remote_addr not in LOCAL_ADDRESSES:
+        abort(403)
+
+    collect_runtime_stats()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def mark_process_dead(pid):
+    """Drops the live gauges of an exited worker; call from the server's worker exit hook."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
+
+
+def init_app(app: Flask):
+    """Register the metrics endpoint and request hooks if METRICS_ENABLED is set."""
+    if not app.config.get("METRICS_ENABLED"):
+        return
+    app.register_blueprint(bp)
+    app.before_request(start_timer)
+    app.after_request(observe_request)
@@ -0,0 +1,140 @@
+"""
+This module applies versioned SQL migrations to an existing database.
+
+Migrations live in migrations/ as NNNN_description.sql. Pending ones are applied in version
+order, each in its own transaction, and recorded in the schema_migrations table so upgrades
+can be rerun safely. schema.sql always describes the latest version, so init-db stamps every
+migration as applied instead of running them.
+
+A migration whose first line is "-- no-transaction" runs statement by statement in autocommit
+mode instead, for statements such as CREATE INDEX CONCURRENTLY that cannot run in a transaction.
+Such files must not contain function bodies, since they are split on semicolons. Indexes
+they build concurrently are dropped first if an earlier, interrupted run left them invalid.
+"""
+import os
+import re
+
+from flask import current_app
+from psycopg2 import sql
+from psycopg2.extensions import connection
+
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+NO_TRANSACTION = "-- no-transaction"
+CONCURRENT_INDEX = re.compile(r"CREATE\s+INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+# pg_advisory_lock key that serialises concurrent migration runs
+MIGRATION_LOCK = 7_341_011
+
+
+def list_migrations():
+    """Returns (version, name, path) for every migration file, oldest first."""
+    directory = os.path.join(current_app.root_path, "migrations")
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    return sorted(migrations)
+
+
+def ensure_version_table(cursor):
+    """Creates the table that tracks applied migrations."""
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INT PRIMARY KEY,"
+        " name VARCHAR(255) NOT NULL,"
+        " applied TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+
+def fetch_applied(cursor):
+    """Returns the set of applied migration versions."""
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def split_statements(script):
+    """Splits a migration without function bodies into its statements, dropping comments."""
+    lines = [line for line in script.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def drop_invalid_index(cursor, name):
+    """Drops an index left invalid by an interrupted concurrent build, so it is built again."""
+    cursor.execute(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid"
+        " WHERE c.relname = %s AND NOT i.indisvalid",
+        (name.lower(),),
+    )
+    if cursor.fetchone():
+        cursor.execute(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(name.lower())))
+
+
+def run_without_transaction(db: connection, script):
+    """Runs a migration statement by statement in autocommit mode."""
+    db.commit()
+    db.autocommit = True
+    try:
+        cursor = db.cursor()
+        for name in CONCURRENT_INDEX.findall(script):
+            drop_invalid_index(cursor, name)
+        for statement in split_statements(script):
+            cursor.execute(statement)
+    finally:
+        db.autocommit = False
+
+
+def migration_status(db: connection):
+    """Returns (version, name, applied) for every migration."""
+    cursor = db.cursor()
+    ensure_version_table(cursor)
+    db.commit()
+    applied = fetch_applied(cursor)
+    return [(version, name, version in applied) for version, name, _ in list_migrations()]
+
+
+def migrate(db: connection):
+    """Applies pending migrations in order and returns the (version, name) pairs applied.
+
+    Raises psycopg2.Error if a migration fails; earlier migrations stay applied.
+    """
+    cursor = db.cursor()
+    applied = []
+    cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK,))
+    try:
+        ensure_version_table(cursor)
+        db.commit()
+        done = fetch_applied(cursor)
+        for version, name, path in list_migrations():
+            if version in done:
+                continue
+            with open(path, encoding="utf-8") as file:
+                script = file.read()
+            if script.startswith(NO_TRANSACTION):
+                run_without_transaction(db, script)
+            else:
+                cursor.execute(script)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name)
+            )
+            db.commit()
+            applied.append((version, name))
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK,))
+        db.commit()
+    return applied
+
+
+def stamp(db: connection):
+    """Marks every migration as applied, for databases freshly built from schema.sql."""
+    cursor = db.cursor()
+    ensure_version_table(cursor)
+    for version, name, _ in list_migrations():
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+            (version, name),
+        )
+    db.commit()
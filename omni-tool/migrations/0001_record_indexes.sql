@@ -0,0 +1,8 @@
+-- no-transaction
+-- Indexes behind the joins, filters and sort order used by RecordDao; built concurrently so
+-- upgrading a live database does not block writes to Record
+CREATE INDEX CONCURRENTLY IF NOT EXISTS record_creator_idx ON Record (creator_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS record_project_1_idx ON Record (project_id_1);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS record_project_2_idx ON Record (project_id_2);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS record_created_idx ON Record (created DESC, record_id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS userprojects_project_idx ON UserProjects (project_id);
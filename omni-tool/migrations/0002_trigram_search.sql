@@ -0,0 +1,7 @@
+-- no-transaction
+-- Substring and prefix search on the record table filters
+-- 0002-0005 replace upgrade.sql; everything is IF NOT EXISTS so databases it upgraded apply cleanly
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS record_name_trgm_idx ON Record USING GIN (record_name gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS record_uid_trgm_idx ON Record USING GIN (uid gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS record_uid_prefix_idx ON Record (uid varchar_pattern_ops);
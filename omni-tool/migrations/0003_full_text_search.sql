@@ -0,0 +1,31 @@
+-- Full-text search over descriptions and data locations. A STORED generated column would
+-- rewrite Record under an ACCESS EXCLUSIVE lock, so search_document is a plain column kept by
+-- a trigger: adding it only changes the catalog. Existing rows are filled in batches and the
+-- index is built concurrently by 0013.
+ALTER TABLE Record ADD COLUMN IF NOT EXISTS search_document TSVECTOR;
+
+CREATE OR REPLACE FUNCTION record_search_document() RETURNS TRIGGER AS
+$$
+BEGIN
+    NEW.search_document := setweight(to_tsvector('english', NEW.record_description), 'A') ||
+                           setweight(to_tsvector('english', NEW.data_location), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS record_search_document ON Record;
+DO
+$$
+BEGIN
+    -- Databases upgraded with the former upgrade-db keep their generated column
+    IF NOT EXISTS (SELECT 1
+                   FROM pg_attribute
+                   WHERE attrelid = 'record'::regclass
+                     AND attname = 'search_document'
+                     AND attgenerated <> '') THEN
+        CREATE TRIGGER record_search_document
+            BEFORE INSERT OR UPDATE OF record_description, data_location ON Record
+            FOR EACH ROW EXECUTE FUNCTION record_search_document();
+    END IF;
+END
+$$;
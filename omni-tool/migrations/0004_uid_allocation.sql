@@ -0,0 +1,20 @@
+-- Atomic UID allocation; the sequence continues after the record ids already used in UIDs
+ALTER TABLE Record ALTER COLUMN uid TYPE VARCHAR(32);
+CREATE SEQUENCE IF NOT EXISTS record_uid_seq;
+SELECT setval('record_uid_seq', GREATEST(
+    (SELECT last_value FROM record_uid_seq),
+    (SELECT COALESCE(MAX(record_id), 1) FROM Record)
+));
+
+CREATE OR REPLACE FUNCTION allocate_uid(p_project_id_1 INT, p_project_id_2 INT, p_created TIMESTAMP)
+    RETURNS VARCHAR AS
+$$
+SELECT 'CRC' || to_char(p_created, 'YYYYMMDD')
+           || lpad(seq::TEXT, GREATEST(3, length(seq::TEXT)), '0')
+           || p1.code || p2.code
+FROM nextval('record_uid_seq') AS seq,
+     Project p1,
+     Project p2
+WHERE p1.project_id = p_project_id_1
+  AND p2.project_id = p_project_id_2
+$$ LANGUAGE SQL VOLATILE;
@@ -0,0 +1,12 @@
+-- UIDs handed out ahead of their records, e.g. for pre-printed labels
+CREATE TABLE IF NOT EXISTS UidReservation
+(
+    uid          VARCHAR(32) PRIMARY KEY,
+    project_id_1 INT       NOT NULL,
+    project_id_2 INT       NOT NULL,
+    reserved_by  INT,
+    reserved     TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id_1) REFERENCES Project (project_id),
+    FOREIGN KEY (project_id_2) REFERENCES Project (project_id),
+    FOREIGN KEY (reserved_by) REFERENCES Users (user_id) ON DELETE SET NULL
+);
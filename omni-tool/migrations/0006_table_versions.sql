@@ -0,0 +1,38 @@
+-- Per-table change counters behind the ETags of the record and project fragments
+CREATE TABLE IF NOT EXISTS table_version
+(
+    table_name VARCHAR(64) PRIMARY KEY,
+    version    BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO table_version (table_name)
+VALUES ('record'), ('project'), ('users'), ('userprojects')
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS TRIGGER AS
+$$
+BEGIN
+    UPDATE table_version SET version = version + 1 WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS record_version_trigger ON Record;
+CREATE TRIGGER record_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Record
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+DROP TRIGGER IF EXISTS project_version_trigger ON Project;
+CREATE TRIGGER project_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Project
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+DROP TRIGGER IF EXISTS users_version_trigger ON Users;
+CREATE TRIGGER users_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Users
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+DROP TRIGGER IF EXISTS userprojects_version_trigger ON UserProjects;
+CREATE TRIGGER userprojects_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON UserProjects
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
@@ -0,0 +1,96 @@
+-- Record counts per project, month, data_location_type and invenio status for the
+-- statistics dashboard, kept current by statement triggers so reads never scan Record.
+-- A record counts once under project_id_1 (is_primary) and once under project_id_2
+-- when it has a distinct second project; totals sum the is_primary rows only.
+CREATE TABLE IF NOT EXISTS record_summary
+(
+    project_id         INT          NOT NULL,
+    is_primary         BOOLEAN      NOT NULL,
+    month              DATE         NOT NULL,
+    data_location_type VARCHAR(255) NOT NULL,
+    invenio            BOOLEAN      NOT NULL,
+    records            BIGINT       NOT NULL DEFAULT 0,
+    PRIMARY KEY (project_id, is_primary, month, data_location_type, invenio)
+);
+
+CREATE OR REPLACE FUNCTION record_summary_apply() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        TRUNCATE record_summary;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO record_summary AS s (project_id, is_primary, month, data_location_type, invenio, records)
+        SELECT project_id, is_primary, month, data_location_type, invenio, -COUNT(*)
+        FROM (SELECT COALESCE(project_id_1, 0) AS project_id, TRUE AS is_primary,
+                     date_trunc('month', created)::DATE AS month, data_location_type,
+                     COALESCE(invenio, FALSE) AS invenio
+              FROM old_rows
+              UNION ALL
+              SELECT project_id_2, FALSE, date_trunc('month', created)::DATE, data_location_type,
+                     COALESCE(invenio, FALSE)
+              FROM old_rows
+              WHERE project_id_2 <> 0 AND project_id_2 IS DISTINCT FROM project_id_1) AS contributions
+        GROUP BY project_id, is_primary, month, data_location_type, invenio
+        ON CONFLICT (project_id, is_primary, month, data_location_type, invenio)
+            DO UPDATE SET records = s.records + EXCLUDED.records;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO record_summary AS s (project_id, is_primary, month, data_location_type, invenio, records)
+        SELECT project_id, is_primary, month, data_location_type, invenio, COUNT(*)
+        FROM (SELECT COALESCE(project_id_1, 0) AS project_id, TRUE AS is_primary,
+                     date_trunc('month', created)::DATE AS month, data_location_type,
+                     COALESCE(invenio, FALSE) AS invenio
+              FROM new_rows
+              UNION ALL
+              SELECT project_id_2, FALSE, date_trunc('month', created)::DATE, data_location_type,
+                     COALESCE(invenio, FALSE)
+              FROM new_rows
+              WHERE project_id_2 <> 0 AND project_id_2 IS DISTINCT FROM project_id_1) AS contributions
+        GROUP BY project_id, is_primary, month, data_location_type, invenio
+        ON CONFLICT (project_id, is_primary, month, data_location_type, invenio)
+            DO UPDATE SET records = s.records + EXCLUDED.records;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow a single event per trigger
+DROP TRIGGER IF EXISTS record_summary_insert ON Record;
+CREATE TRIGGER record_summary_insert
+    AFTER INSERT ON Record REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_summary_apply();
+
+DROP TRIGGER IF EXISTS record_summary_update ON Record;
+CREATE TRIGGER record_summary_update
+    AFTER UPDATE ON Record REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_summary_apply();
+
+DROP TRIGGER IF EXISTS record_summary_delete ON Record;
+CREATE TRIGGER record_summary_delete
+    AFTER DELETE ON Record REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_summary_apply();
+
+DROP TRIGGER IF EXISTS record_summary_truncate ON Record;
+CREATE TRIGGER record_summary_truncate
+    AFTER TRUNCATE ON Record
+    FOR EACH STATEMENT EXECUTE FUNCTION record_summary_apply();
+
+-- Backfill from the existing records while writes are held off
+LOCK TABLE Record IN SHARE ROW EXCLUSIVE MODE;
+TRUNCATE record_summary;
+INSERT INTO record_summary (project_id, is_primary, month, data_location_type, invenio, records)
+SELECT project_id, is_primary, month, data_location_type, invenio, COUNT(*)
+FROM (SELECT COALESCE(project_id_1, 0) AS project_id, TRUE AS is_primary,
+             date_trunc('month', created)::DATE AS month, data_location_type,
+             COALESCE(invenio, FALSE) AS invenio
+      FROM Record
+      UNION ALL
+      SELECT project_id_2, FALSE, date_trunc('month', created)::DATE, data_location_type,
+             COALESCE(invenio, FALSE)
+      FROM Record
+      WHERE project_id_2 <> 0 AND project_id_2 IS DISTINCT FROM project_id_1) AS contributions
+GROUP BY project_id, is_primary, month, data_location_type, invenio;
@@ -0,0 +1,34 @@
+-- Replace the per-table counter rows of 0006, which every writer locked until commit, with an
+-- append-only change log. Writers only insert, so they never wait on each other, and a change
+-- becomes visible to readers exactly when its transaction commits.
+CREATE TABLE IF NOT EXISTS table_change
+(
+    change_id  BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS table_change_table_idx ON table_change (table_name, change_id);
+
+INSERT INTO table_change (table_name)
+SELECT t.table_name
+FROM (VALUES ('record'), ('project'), ('users'), ('userprojects')) AS t(table_name)
+WHERE NOT EXISTS (SELECT 1 FROM table_change c WHERE c.table_name = t.table_name);
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS TRIGGER AS
+$$
+BEGIN
+    INSERT INTO table_change (table_name) VALUES (TG_TABLE_NAME);
+    -- Now and then drop older entries; SKIP LOCKED leaves rows another writer is compacting
+    IF random() < 0.01 THEN
+        DELETE
+        FROM table_change
+        WHERE change_id IN (SELECT change_id
+                            FROM table_change
+                            WHERE table_name = TG_TABLE_NAME
+                              AND change_id < (SELECT max(change_id) FROM table_change WHERE table_name = TG_TABLE_NAME)
+                                FOR UPDATE SKIP LOCKED);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TABLE IF EXISTS table_version;
@@ -0,0 +1,65 @@
+-- Replace the record_summary upserts of 0007, which made concurrent writers in the same
+-- project and month wait on the same row, with append-only delta rows. Writers only insert,
+-- readers sum the deltas per key, and now and then a writer folds them back into one row
+-- per key.
+ALTER TABLE record_summary DROP CONSTRAINT IF EXISTS record_summary_pkey;
+ALTER TABLE record_summary ADD COLUMN IF NOT EXISTS summary_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY;
+CREATE INDEX IF NOT EXISTS record_summary_key_idx
+    ON record_summary (project_id, is_primary, month, data_location_type, invenio);
+
+CREATE OR REPLACE FUNCTION record_summary_apply() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        TRUNCATE record_summary;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO record_summary (project_id, is_primary, month, data_location_type, invenio, records)
+        SELECT project_id, is_primary, month, data_location_type, invenio, -COUNT(*)
+        FROM (SELECT COALESCE(project_id_1, 0) AS project_id, TRUE AS is_primary,
+                     date_trunc('month', created)::DATE AS month, data_location_type,
+                     COALESCE(invenio, FALSE) AS invenio
+              FROM old_rows
+              UNION ALL
+              SELECT project_id_2, FALSE, date_trunc('month', created)::DATE, data_location_type,
+                     COALESCE(invenio, FALSE)
+              FROM old_rows
+              WHERE project_id_2 <> 0 AND project_id_2 IS DISTINCT FROM project_id_1) AS contributions
+        GROUP BY project_id, is_primary, month, data_location_type, invenio;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO record_summary (project_id, is_primary, month, data_location_type, invenio, records)
+        SELECT project_id, is_primary, month, data_location_type, invenio, COUNT(*)
+        FROM (SELECT COALESCE(project_id_1, 0) AS project_id, TRUE AS is_primary,
+                     date_trunc('month', created)::DATE AS month, data_location_type,
+                     COALESCE(invenio, FALSE) AS invenio
+              FROM new_rows
+              UNION ALL
+              SELECT project_id_2, FALSE, date_trunc('month', created)::DATE, data_location_type,
+                     COALESCE(invenio, FALSE)
+              FROM new_rows
+              WHERE project_id_2 <> 0 AND project_id_2 IS DISTINCT FROM project_id_1) AS contributions
+        GROUP BY project_id, is_primary, month, data_location_type, invenio;
+    END IF;
+
+    -- Now and then fold the deltas into one row per key; SKIP LOCKED leaves rows another
+    -- writer is compacting, and uncommitted deltas are not visible here, so sums are kept
+    IF random() < 0.01 THEN
+        WITH folded AS (
+            DELETE
+            FROM record_summary
+            WHERE summary_id IN (SELECT summary_id FROM record_summary FOR UPDATE SKIP LOCKED)
+            RETURNING project_id, is_primary, month, data_location_type, invenio, records)
+        INSERT
+        INTO record_summary (project_id, is_primary, month, data_location_type, invenio, records)
+        SELECT project_id, is_primary, month, data_location_type, invenio, SUM(records)
+        FROM folded
+        GROUP BY project_id, is_primary, month, data_location_type, invenio
+        HAVING SUM(records) <> 0;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
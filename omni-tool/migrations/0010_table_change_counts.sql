@@ -0,0 +1,31 @@
+-- Versions of 0008 were (number of log entries, newest id). Compaction deletes entries, and
+-- with commits landing out of id order an earlier pair could come back. Each entry now carries
+-- the number of changes it stands for, and compaction folds the entries it removes into the
+-- writer's own new entry, so a table's version (the sum) only ever grows.
+ALTER TABLE table_change ADD COLUMN IF NOT EXISTS changes BIGINT NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS TRIGGER AS
+$$
+DECLARE
+    entry BIGINT;
+BEGIN
+    INSERT INTO table_change (table_name) VALUES (TG_TABLE_NAME) RETURNING change_id INTO entry;
+    -- Now and then fold the older entries into this one; SKIP LOCKED leaves rows another
+    -- writer is folding, and the fold commits or rolls back together with this entry
+    IF random() < 0.01 THEN
+        WITH folded AS (
+            DELETE
+            FROM table_change
+            WHERE change_id IN (SELECT change_id
+                                FROM table_change
+                                WHERE table_name = TG_TABLE_NAME
+                                  AND change_id <> entry
+                                    FOR UPDATE SKIP LOCKED)
+            RETURNING changes)
+        UPDATE table_change
+        SET changes = changes + (SELECT COALESCE(sum(changes), 0) FROM folded)
+        WHERE change_id = entry;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,33 @@
+-- Notify listening workers of committed writes to the rarely written tables, so they can
+-- check their identity caches without reading table_change on every request.
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS TRIGGER AS
+$$
+DECLARE
+    entry BIGINT;
+BEGIN
+    INSERT INTO table_change (table_name) VALUES (TG_TABLE_NAME) RETURNING change_id INTO entry;
+    -- Now and then fold the older entries into this one; SKIP LOCKED leaves rows another
+    -- writer is folding, and the fold commits or rolls back together with this entry
+    IF random() < 0.01 THEN
+        WITH folded AS (
+            DELETE
+            FROM table_change
+            WHERE change_id IN (SELECT change_id
+                                FROM table_change
+                                WHERE table_name = TG_TABLE_NAME
+                                  AND change_id <> entry
+                                    FOR UPDATE SKIP LOCKED)
+            RETURNING changes)
+        UPDATE table_change
+        SET changes = changes + (SELECT COALESCE(sum(changes), 0) FROM folded)
+        WHERE change_id = entry;
+    END IF;
+
+    -- Workers keep their identity caches current from these; record is left out because NOTIFY
+    -- serializes committing transactions and records are written all the time
+    IF TG_TABLE_NAME <> 'record' THEN
+        PERFORM pg_notify('table_change', TG_TABLE_NAME);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
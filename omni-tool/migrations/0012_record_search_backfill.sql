@@ -0,0 +1,33 @@
+-- Fills search_document for the rows that existed before 0003 added it, committing after each
+-- batch of record ids so no batch holds its row locks for long. Called by 0013, which cannot
+-- define a function body itself. Databases whose search_document is a generated column
+-- (from the former upgrade-db or an earlier 0003) have nothing to fill.
+CREATE OR REPLACE PROCEDURE record_search_backfill(batch_size INT) AS
+$$
+DECLARE
+    next_id BIGINT;
+    last_id BIGINT;
+BEGIN
+    IF EXISTS (SELECT 1
+               FROM pg_attribute
+               WHERE attrelid = 'record'::regclass
+                 AND attname = 'search_document'
+                 AND attgenerated <> '') THEN
+        RETURN;
+    END IF;
+
+    -- Rows inserted from here on are filled by the trigger
+    SELECT min(record_id), max(record_id) INTO next_id, last_id FROM Record;
+    WHILE next_id <= last_id
+        LOOP
+            UPDATE Record
+            SET search_document = setweight(to_tsvector('english', record_description), 'A') ||
+                                  setweight(to_tsvector('english', data_location), 'B')
+            WHERE record_id >= next_id
+              AND record_id < next_id + batch_size
+              AND search_document IS NULL;
+            next_id := next_id + batch_size;
+            COMMIT;
+        END LOOP;
+END
+$$ LANGUAGE plpgsql;
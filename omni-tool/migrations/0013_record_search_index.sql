@@ -0,0 +1,6 @@
+-- no-transaction
+-- Fill search_document for existing records in committed batches, then build the full-text
+-- index without blocking writes to Record
+CALL record_search_backfill(5000);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS record_search_idx ON Record USING GIN (search_document);
+DROP PROCEDURE IF EXISTS record_search_backfill(INT);
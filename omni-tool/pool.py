@@ -0,0 +1,253 @@
+"""
+This module provides a connection pool for sharing PostgreSQL connections between requests.
+
+Connections are opened lazily inside each worker process, so a pool created in a gunicorn
+master (``--preload``) never hands an inherited socket to a forked worker.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extras
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_UNKNOWN,
+    connection,
+)
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """Raised when no connection becomes available before the checkout timeout."""
+
+
+class PooledConnection(connection):
+    """psycopg2 connection that remembers when it was opened and last returned.
+
+    prepared holds the names of the server-side prepared statements of its session.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.returned_at = self.created_at
+        self.prepared = set()
+
+
+class ConnectionPool:
+    """Thread-safe, fork-aware pool of psycopg2 connections."""
+
+    def __init__(
+        self,
+        dsn,
+        min_size=1,
+        max_size=10,
+        timeout=5.0,
+        max_lifetime=1800.0,
+        idle_check=30.0,
+        cursor_factory=psycopg2.extras.DictCursor,
+    ):
+        if min_size > max_size:
+            raise ValueError("min_size cannot be larger than max_size")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_check = idle_check
+        self.cursor_factory = cursor_factory
+        self._fork_lock = threading.Lock()
+        self._pid = None
+        self._orphaned = []
+        self._reset()
+
+    def _reset(self):
+        """Start from an empty pool owned by the current process."""
+        # Connections inherited through fork share their socket with the parent; closing them
+        # here would terminate the parent's session, so they are only kept referenced.
+        if self._pid is not None:
+            self._orphaned.extend(self._idle)
+            self._orphaned.extend(self._in_use)
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = set()
+        self._size = 0
+        self._warm = False
+        self._pid = os.getpid()
+        self._counters = {
+            "connections_opened": 0,
+            "connections_recycled": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    def _ensure_process(self):
+        """Drop state inherited from a parent process after fork."""
+        if self._pid != os.getpid():
+            with self._fork_lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    def _connect(self):
+        conn = psycopg2.connect(
+            self.dsn,
+            connection_factory=PooledConnection,
+            cursor_factory=self.cursor_factory,
+        )
+        with self._cond:
+            self._counters["connections_opened"] += 1
+        return conn
+
+    def _warm_up(self):
+        """Open min_size connections the first time this process uses the pool."""
+        with self._cond:
+            if self._warm:
+                return
+            self._warm = True
+            missing = max(0, self.min_size - self._size)
+            self._size += missing
+        opened = []
+        try:
+            for _ in range(missing):
+                opened.append(self._connect())
+        finally:
+            with self._cond:
+                self._size -= missing - len(opened)
+                self._idle.extend(opened)
+                self._cond.notify_all()
+
+    def _expired(self, conn):
+        return self.max_lifetime and time.monotonic() - conn.created_at > self.max_lifetime
+
+    def _usable(self, conn):
+        """Check that an idle connection can be handed out."""
+        if conn.closed or self._expired(conn):
+            return False
+        if self.idle_check is not None and time.monotonic() - conn.returned_at > self.idle_check:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _discard(self, conn):
+        """Close a connection and release its slot."""
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._counters["connections_recycled"] += 1
+            self._cond.notify()
+
+    def checkout(self, timeout=None):
+        """Borrow a connection, waiting up to timeout seconds for one to free up."""
+        self._ensure_process()
+        if not self._warm:
+            self._warm_up()
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No database connection available after {timeout}s "
+                            f"({self._size} open, max {self.max_size})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._usable(conn):
+                self._discard(conn)
+                continue
+            break
+
+        wait_time = time.monotonic() - started
+        with self._cond:
+            self._in_use.add(conn)
+            self._counters["checkouts"] += 1
+            if waited:
+                self._counters["waits"] += 1
+            self._counters["wait_time_total"] += wait_time
+            self._counters["wait_time_max"] = max(self._counters["wait_time_max"], wait_time)
+        return conn
+
+    def checkin(self, conn):
+        """Return a borrowed connection, rolling back or recycling it as needed."""
+        self._ensure_process()
+        with self._cond:
+            if conn not in self._in_use:
+                return
+            self._in_use.discard(conn)
+
+        if conn.closed or conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+            self._discard(conn)
+            return
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._discard(conn)
+                return
+        if self._expired(conn):
+            self._discard(conn)
+            return
+
+        conn.returned_at = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        """Close every idle connection owned by this process."""
+        self._ensure_process()
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """Return a snapshot of pool utilisation for the current process."""
+        self._ensure_process()
+        with self._cond:
+            stats = dict(self._counters)
+            stats.update(
+                pid=self._pid,
+                size=self._size,
+                in_use=len(self._in_use),
+                idle=len(self._idle),
+                min_size=self.min_size,
+                max_size=self.max_size,
+            )
+        checkouts = stats["checkouts"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / checkouts if checkouts else 0.0
+        return stats
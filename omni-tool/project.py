@@ -29,11 +29,14 @@ from flask import Blueprint, render_template, request
 
 from app.auth import admin_permissions
 from app.db import get_projectdao
+from app.etag import conditional
+from app.fragments import render_fragment
 
 bp = Blueprint("project", __name__, url_prefix="/project")
 
 
 @bp.route("/")
+@conditional("project", "users")
 def display_page():
     """Display projects in a table"""
     projects = get_projectdao().fetch_projects()
@@ -70,7 +73,7 @@ def create_project():
             "created": created_date,
         }
         project_info["project_id"] = get_projectdao().create_project(project_info)
-        return render_template("project/row.html", project=project_info)
+        return render_fragment("project/row.html", project=project_info)
 
     return render_template("project/create.html", created_date=created_date)
 
@@ -97,7 +100,7 @@ def update_project(project_id):
     project_info = {"project_name": request.form["project_name"], "finished": bool(request.form.get("finished"))}
     get_projectdao().update_project(project_info, project_id)
     project = get_projectdao().fetch_project_by_id(project_id)
-    return render_template("project/row.html", project=project)
+    return render_fragment("project/row.html", project=project)
 
 
 @bp.delete("/<int:project_id>")
@@ -109,10 +112,11 @@ def delete_project(project_id):
 
 
 @bp.route("/row/<int:project_id>/")
+@conditional("project")
 def render_row(project_id):
     """Render a single project row"""
     project = get_projectdao().fetch_project_by_id(project_id)
-    return render_template("project/row.html", project=project)
+    return render_fragment("project/row.html", project=project)
 
 
 @bp.route("/clear")
@@ -10,18 +10,21 @@ Blueprint Details:
 - Decorators: login_required (applied to all routes)
 
 Routes:
-- GET /record/ : Display record entries in a table
+- GET /record/ : Display the first page of record entries in a table
 - POST /record/record_name: Check if record with a given name already exists
-- GET/POST /record/create : Create a new record entry
+- GET/POST /record/create : Create a new record entry, optionally with a reserved UID
+- GET/POST /record/reserve : Reserve a block of UIDs and download them as a list
+- GET/POST /record/import : Bulk import records from a CSV or JSON Lines file
 - GET /record/download/<int:record_id> : Download the README file for a record entry
 - GET/POST /record/update : Update a record entry
+- GET /record/update/rows : Render the next page of records in the user's projects
 - DELETE /record/<int:record_id> : Remove a record entry
 - GET /record/<int:record_id> : Fetch a record entry
 - GET /record/row/<int:record_id> : Render a single record row
 - GET /record/edit/<int:record_id> : Render input fields to edit a record entry
 - POST /record/location-type : Fetch record by location type
-- POST /record/filter : Filter the record table
-- GET /record/download-table-csv : Download the record table as a CSV
+- GET/POST /record/filter : Filter the record table, one page per request
+- GET /record/download-table-csv : Stream the filtered record table as a CSV
 - GET /record/delete-confirmation/<int:record_id> : Display delete confirmation for a record entry
 
 """
@@ -30,33 +33,112 @@ from datetime import datetime
 
 from flask import (
     Blueprint,
+    abort,
+    current_app,
+    make_response,
     render_template,
     request,
     session,
     url_for,
     send_file,
+    stream_with_context,
     Response,
 )
+from flask.sessions import session_json_serializer
+from markupsafe import Markup, escape
 
-from app.auth import login_required
-from app.dao.RecordDao import write_to_csv
+from app.auth import admin_permissions, login_required
+from app.dao.RecordDao import HIGHLIGHT_START, HIGHLIGHT_STOP, write_to_csv
 from app.db import get_recorddao, get_projectdao, get_userdao
+from app.etag import compute_etag, conditional, not_modified, tag
+from app.fragments import render_fragment
+from app.importer import import_records, open_upload, read_rows
+from app.metrics import count_uids
 
 bp = Blueprint("record", __name__, url_prefix="/record")
 
+# Keyset cursor form field -> (DAO filter, parser)
+CURSOR_FIELDS = {
+    "after-id": ("after_record_id", int),
+    "after-created": ("after_created", datetime.fromisoformat),
+    "after-rank": ("after_rank", float),
+}
+
+# Filters are kept in the session, so larger ones are refused rather than stored
+FILTERS_MAX_BYTES = 1024
+
+
+def get_page_size(values):
+    """Returns the requested record table page size, bounded by the configured maximum."""
+    page_size = values.get("page-size", current_app.config["RECORD_PAGE_SIZE"], type=int)
+    return max(1, min(page_size, current_app.config["RECORD_MAX_PAGE_SIZE"]))
+
+
+def get_record_filters(values):
+    """Builds record table filters from the filter form."""
+    filters = {
+        "record_name_match": values.get("record-name", ""),
+        "from_date": values.get("from-date", ""),
+        "to_date": values.get("to-date", ""),
+        "email": values.get("email", ""),
+        "data_location_type": values.get("data-location-type", ""),
+        "invenio": values.get("invenio", ""),
+        "project": values.get("project", ""),
+        "uid": values.get("uid", ""),
+        "search": values.get("search", ""),
+    }
+    # Measured as the session stores them, where non-ASCII text is escaped
+    if len(session_json_serializer.dumps(filters)) > FILTERS_MAX_BYTES:
+        abort(400, f"Filters longer than {FILTERS_MAX_BYTES} bytes")
+    return filters
+
+
+def fetch_record_page(filters, values):
+    """Fetches one page of the record table and the cursor of the page after it."""
+    page_size = get_page_size(values)
+    page_filters = dict(filters, limit=page_size + 1, highlight=True)
+    for field, (key, parse) in CURSOR_FIELDS.items():
+        if values.get(field):
+            try:
+                page_filters[key] = parse(values[field])
+            except ValueError:
+                abort(400, f"Invalid {field} cursor")
+
+    record_entries = get_recorddao().fetch_record_table(page_filters) or []
+    if len(record_entries) <= page_size:
+        return record_entries, None
+
+    record_entries = record_entries[:page_size]
+    last = record_entries[-1]
+    next_cursor = {"after-id": last["record_id"], "page-size": page_size}
+    if filters.get("search"):
+        next_cursor["after-rank"] = last["search_rank"]
+    else:
+        next_cursor["after-created"] = last["created"].isoformat(sep=" ")
+    return record_entries, next_cursor
+
+
+@bp.app_template_filter("highlight")
+def highlight(snippet):
+    """Renders a full-text search snippet with its matches wrapped in <mark>."""
+    html = str(escape(snippet)).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_STOP, "</mark>")
+    return Markup(html)
+
 
 @bp.route("/")
 def display_page():
-    """Display record entries in a table."""
-    record_entries = get_recorddao().fetch_record_table(filters={})
-    session["record"] = record_entries
+    """Display the first page of record entries in a table."""
+    record_entries, next_cursor = fetch_record_page({}, request.args)
+    session["record_filters"] = {}
     projects = get_projectdao().fetch_projects()
-    emails = get_userdao().fetch_user_emails()
-    print(emails)
-    emails = [email[0] for email in emails]
+    emails = [email[0] for email in get_userdao().fetch_user_emails() or []]
 
     return render_template(
-        "record/index.html", record_entries=record_entries, projects=projects, emails=emails
+        "record/index.html",
+        record_entries=record_entries,
+        next_cursor=next_cursor,
+        projects=projects,
+        emails=emails,
     )
 
 
@@ -87,31 +169,28 @@ def create_record():
             "data_location_type": request.form["data-location-type"],
             "data_location": request.form["data-location"],
             "db_created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "uid": "",
         }
 
-        project1_id = record_info["project1_id"]
-        project2_id = record_info["project2_id"]
-
-        if project1_id != project2_id and project2_id != "0":
-            project1_code, project2_code = get_projectdao().get_projects_from_id(
-                project1_id, project2_id
-            )
-        else:
-            project1_code = get_projectdao().get_projects_from_id(
-                project1_id
-            )[0]
+        # A record with a single project is stored against the empty "XX" project
+        if record_info["project2_id"] == record_info["project1_id"]:
             record_info["project2_id"] = "0"
-            project2_code = ["XX"]
-
-        record_id = get_recorddao().fetch_last_record_id()
-        record_id = str(1).zfill(3) if record_id is None else str(record_id[0] + 1).zfill(3)
-        id_date = datetime.now().strftime("%Y%m%d")
-        uid = f"CRC{id_date}{record_id}{project1_code[0]}{project2_code[0]}"
-        print(uid)
-        record_info["uid"] = uid
 
-        get_recorddao().create_record(record_info=record_info)
+        # A UID reserved ahead, e.g. on a pre-printed label, is claimed instead of a new one
+        reserved_uid = request.form.get("reserved-uid", "").strip()
+        if reserved_uid:
+            reservations = get_recorddao().fetch_reserved_uids([reserved_uid])
+            if reservations is None:
+                return "Error creating record."
+            projects = tuple(str(project_id) for project_id in reservations.get(reserved_uid, ()))
+            if projects != (record_info["project1_id"], record_info["project2_id"]):
+                return f"UID {reserved_uid} is not reserved for these projects."
+            record_info["reserved_uid"] = reserved_uid
+
+        record = get_recorddao().create_record(record_info=record_info)
+        if record is None:
+            return "Error creating record."
+        count_uids("record")
+        record_id = record["record_id"]
 
         download_url = url_for("record.download_readme", record_id=record_id)
         record_page_url = url_for("record.display_page")
@@ -123,6 +202,69 @@ def create_record():
     return render_template("record/create.html", projects=project_list)
 
 
+@bp.route("/reserve", methods=["GET", "POST"])
+@login_required
+def reserve_uids():
+    """Reserve a block of UIDs for a project pair and download them as a list."""
+    user_id = session["user_id"]
+    project_list = get_projectdao().fetch_project_by_user(user_id) or []
+
+    if request.method == "POST":
+        project1_id = request.form.get("project1-id", type=int)
+        project2_id = request.form.get("project2-id", type=int)
+        count = request.form.get("count", type=int)
+        allowed = {project["project_id"] for project in project_list} | {0}
+        max_count = current_app.config["UID_RESERVATION_MAX"]
+
+        if project1_id not in allowed or project2_id not in allowed or project1_id == 0:
+            return render_template(
+                "record/reserve.html", projects=project_list, error="Pick one of your projects."
+            ), 400
+        if count is None or not 1 <= count <= max_count:
+            return render_template(
+                "record/reserve.html", projects=project_list, error=f"Reserve between 1 and {max_count} UIDs."
+            ), 400
+        if project2_id == project1_id:
+            project2_id = 0
+
+        uids = get_recorddao().reserve_uids(project1_id, project2_id, count, user_id)
+        if uids is None:
+            return render_template(
+                "record/reserve.html", projects=project_list, error="Error reserving UIDs."
+            ), 500
+        count_uids("reservation", len(uids))
+
+        return Response(
+            "\n".join(uids) + "\n",
+            mimetype="text/plain",
+            headers={"Content-Disposition": f"attachment;filename=uids-{uids[0]}.txt"},
+        )
+    return render_template("record/reserve.html", projects=project_list)
+
+
+@bp.route("/import", methods=["GET", "POST"])
+@admin_permissions
+def import_page():
+    """Bulk import records from an uploaded CSV or JSON Lines file."""
+    if request.method == "POST":
+        upload = request.files.get("import-file")
+        if upload is None or upload.filename == "":
+            return render_template("record/import-result.html", result=None)
+
+        stream, file_format = open_upload(upload)
+        result = import_records(
+            read_rows(stream, file_format),
+            get_recorddao(),
+            get_projectdao(),
+            get_userdao(),
+            session["user_id"],
+            batch_size=current_app.config["RECORD_IMPORT_BATCH_SIZE"],
+        )
+        count_uids("import", result["imported"])
+        return render_template("record/import-result.html", result=result)
+    return render_template("record/import.html")
+
+
 @bp.get("/download/<int:record_id>")
 @login_required
 def download_readme(record_id):
@@ -146,10 +288,28 @@ def download_readme(record_id):
 @bp.route("/update", methods=["GET", "POST"])
 @login_required
 def update_page():
-    """Update a record entry in the database."""
-    user_id = session["user_id"]
-    record_entries = get_recorddao().fetch_project_record(user_id)
-    return render_template("record/update.html", record_entries=record_entries)
+    """Display the first page of records in the user's projects for updating."""
+    record_entries, next_cursor = fetch_record_page({"visible_to": session["user_id"]}, request.args)
+    return render_template(
+        "record/update.html",
+        record_entries=record_entries,
+        next_cursor=next_cursor,
+        load_more_url=url_for("record.update_rows"),
+    )
+
+
+@bp.get("/update/rows")
+@login_required
+@conditional("record", "project", "users", "userprojects")
+def update_rows():
+    """Render the next page of records in the user's projects."""
+    record_entries, next_cursor = fetch_record_page({"visible_to": session["user_id"]}, request.args)
+    return render_template(
+        "record/update-rows.html",
+        record_entries=record_entries,
+        next_cursor=next_cursor,
+        load_more_url=url_for("record.update_rows"),
+    )
 
 
 @bp.get("/<int:record_id>")
@@ -172,7 +332,7 @@ def update_record(record_id):
     }
     get_recorddao().update_record(record_info=record_info, record_id=record_id)
     record = get_recorddao().fetch_record_by_id(record_id)
-    return render_template("record/row.html", record=record)
+    return render_fragment("record/row.html", record=record)
 
 
 @bp.delete("/<int:record_id>")
@@ -185,10 +345,11 @@ def remove_record(record_id):
 
 @bp.route("/row/<int:record_id>")
 @login_required
+@conditional("record", "project", "users")
 def render_row(record_id):
     """Render a record row."""
     record = get_recorddao().fetch_record_by_id(record_id)
-    return render_template("record/row.html", record=record)
+    return render_fragment("record/row.html", record=record)
 
 
 @bp.get("/edit/<int:record_id>")
@@ -207,33 +368,36 @@ def record_location_field():
     return render_template("record/location.html", location=location)
 
 
-@bp.post("/filter")
+@bp.route("/filter", methods=["GET", "POST"])
 def filter_record_table():
-    """Filters the record table."""
-    filters = {
-        "record_name_match": request.form["record-name"],
-        "from_date": request.form["from-date"],
-        "to_date": request.form["to-date"],
-        "email": request.form["email"],
-        "record_location_type": request.form["data-location-type"],
-        "invenio": request.form["invenio"],
-        "project": request.form["project"],
-        "uid": request.form["uid"],
-    }
-
-    session["record"] = get_recorddao().fetch_record_table(filters)
-
-    return render_template("record/table-body.html", record_entries=session["record"])
+    """Filters the record table, one page at a time."""
+    filters = get_record_filters(request.values)
+    # The CSV export follows the filters even when the page itself is answered with a 304.
+    # Rewriting an unchanged session would re-sign the cookie on every request.
+    if session.get("record_filters") != filters:
+        session["record_filters"] = filters
+    etag = compute_etag("record", "project", "users")
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
+    record_entries, next_cursor = fetch_record_page(filters, request.values)
+    return tag(make_response(render_template(
+        "record/table-body.html", record_entries=record_entries, next_cursor=next_cursor
+    )), etag)
 
 
 @bp.get("/download-table-csv")
 def download_table_csv():
-    """Download the record table as a CSV."""
-    record = session.get("record", {})
-    output = write_to_csv(record)
+    """Stream the record table, as currently filtered, as a CSV."""
+    filters = session.get("record_filters", {})
+    batches = get_recorddao().stream_record_table(
+        filters, batch_size=current_app.config["CSV_EXPORT_BATCH_SIZE"]
+    )
+    output = (write_to_csv(rows) or "" for rows in batches)
 
     return Response(
-        output,
+        stream_with_context(output),
         mimetype="text/csv",
         headers={"Content-Disposition": "attachment;filename=output.csv"},
     )
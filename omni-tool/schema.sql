@@ -1,8 +1,20 @@
+DROP TABLE IF EXISTS schema_migrations;
 DROP TABLE IF EXISTS UserProjects CASCADE;
 DROP TABLE IF EXISTS Users CASCADE;
 DROP TABLE IF EXISTS Record CASCADE;
 DROP TABLE IF EXISTS Project CASCADE;
 DROP TABLE IF EXISTS Coastal6;
+DROP TABLE IF EXISTS UidReservation;
+DROP SEQUENCE IF EXISTS record_uid_seq;
+DROP FUNCTION IF EXISTS allocate_uid(INT, INT, TIMESTAMP);
+DROP FUNCTION IF EXISTS record_search_document();
+DROP TABLE IF EXISTS table_version;
+DROP TABLE IF EXISTS table_change;
+DROP FUNCTION IF EXISTS bump_table_version();
+DROP TABLE IF EXISTS record_summary;
+DROP FUNCTION IF EXISTS record_summary_apply();
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 CREATE TABLE Users
 (
@@ -46,12 +58,225 @@ CREATE TABLE Record
     data_location      VARCHAR(255) NOT NULL,
     invenio            BOOLEAN,
     record_description   VARCHAR(255) NOT NULL,
-    uid                VARCHAR(18)  NOT NULL UNIQUE,
+    uid                VARCHAR(32)  NOT NULL UNIQUE,
+    search_document    TSVECTOR,
     FOREIGN KEY (creator_id) REFERENCES Users (user_id),
     FOREIGN KEY (project_id_1) REFERENCES Project (project_id),
     FOREIGN KEY (project_id_2) REFERENCES Project (project_id)
 );
 
+-- Joins, filters and sort order used by RecordDao
+CREATE INDEX record_creator_idx ON Record (creator_id);
+CREATE INDEX record_project_1_idx ON Record (project_id_1);
+CREATE INDEX record_project_2_idx ON Record (project_id_2);
+CREATE INDEX record_created_idx ON Record (created DESC, record_id DESC);
+CREATE INDEX userprojects_project_idx ON UserProjects (project_id);
+
+-- Substring (ILIKE '%...%') search on the record table filters
+CREATE INDEX record_name_trgm_idx ON Record USING GIN (record_name gin_trgm_ops);
+CREATE INDEX record_uid_trgm_idx ON Record USING GIN (uid gin_trgm_ops);
+-- Prefix (LIKE 'CRC2023...%') search on UIDs
+CREATE INDEX record_uid_prefix_idx ON Record (uid varchar_pattern_ops);
+-- Full-text search over descriptions and data locations, kept current by a trigger
+CREATE INDEX record_search_idx ON Record USING GIN (search_document);
+
+CREATE FUNCTION record_search_document() RETURNS TRIGGER AS
+$$
+BEGIN
+    NEW.search_document := setweight(to_tsvector('english', NEW.record_description), 'A') ||
+                           setweight(to_tsvector('english', NEW.data_location), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER record_search_document
+    BEFORE INSERT OR UPDATE OF record_description, data_location ON Record
+    FOR EACH ROW EXECUTE FUNCTION record_search_document();
+
+-- UIDs are CRC<date><seq><code1><code2>; seq comes from this sequence so concurrent
+-- creators never collide, and allocate_uid builds the whole UID inside the INSERT.
+CREATE SEQUENCE record_uid_seq;
+
+CREATE FUNCTION allocate_uid(p_project_id_1 INT, p_project_id_2 INT, p_created TIMESTAMP)
+    RETURNS VARCHAR AS
+$$
+SELECT 'CRC' || to_char(p_created, 'YYYYMMDD')
+           || lpad(seq::TEXT, GREATEST(3, length(seq::TEXT)), '0')
+           || p1.code || p2.code
+FROM nextval('record_uid_seq') AS seq,
+     Project p1,
+     Project p2
+WHERE p1.project_id = p_project_id_1
+  AND p2.project_id = p_project_id_2
+$$ LANGUAGE SQL VOLATILE;
+
+-- UIDs handed out ahead of their records, e.g. for pre-printed labels
+CREATE TABLE UidReservation
+(
+    uid          VARCHAR(32) PRIMARY KEY,
+    project_id_1 INT       NOT NULL,
+    project_id_2 INT       NOT NULL,
+    reserved_by  INT,
+    reserved     TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (project_id_1) REFERENCES Project (project_id),
+    FOREIGN KEY (project_id_2) REFERENCES Project (project_id),
+    FOREIGN KEY (reserved_by) REFERENCES Users (user_id) ON DELETE SET NULL
+);
+
+-- Append-only log of writes per table behind the ETags and shared cache keys. Writers only
+-- insert, so they never wait on each other. A table's version is the sum of the changes its
+-- committed entries stand for; older entries are now and then folded into a new one, which
+-- keeps the sum, so a version never goes back.
+CREATE TABLE table_change
+(
+    change_id  BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL,
+    changes    BIGINT      NOT NULL DEFAULT 1
+);
+CREATE INDEX table_change_table_idx ON table_change (table_name, change_id);
+
+INSERT INTO table_change (table_name)
+VALUES ('record'), ('project'), ('users'), ('userprojects');
+
+CREATE FUNCTION bump_table_version() RETURNS TRIGGER AS
+$$
+DECLARE
+    entry BIGINT;
+BEGIN
+    INSERT INTO table_change (table_name) VALUES (TG_TABLE_NAME) RETURNING change_id INTO entry;
+    -- Now and then fold the older entries into this one; SKIP LOCKED leaves rows another
+    -- writer is folding, and the fold commits or rolls back together with this entry
+    IF random() < 0.01 THEN
+        WITH folded AS (
+            DELETE
+            FROM table_change
+            WHERE change_id IN (SELECT change_id
+                                FROM table_change
+                                WHERE table_name = TG_TABLE_NAME
+                                  AND change_id <> entry
+                                    FOR UPDATE SKIP LOCKED)
+            RETURNING changes)
+        UPDATE table_change
+        SET changes = changes + (SELECT COALESCE(sum(changes), 0) FROM folded)
+        WHERE change_id = entry;
+    END IF;
+
+    -- Workers keep their identity caches current from these; record is left out because NOTIFY
+    -- serializes committing transactions and records are written all the time
+    IF TG_TABLE_NAME <> 'record' THEN
+        PERFORM pg_notify('table_change', TG_TABLE_NAME);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER record_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Record
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+CREATE TRIGGER project_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Project
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+CREATE TRIGGER users_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Users
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+CREATE TRIGGER userprojects_version_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON UserProjects
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+-- Record counts per project, month, data_location_type and invenio status for the
+-- statistics dashboard, kept current by statement triggers so reads never scan Record.
+-- A record counts once under project_id_1 (is_primary) and once under project_id_2
+-- when it has a distinct second project; totals sum the is_primary rows only. Writers
+-- append delta rows that readers sum per key and that are now and then folded together.
+CREATE TABLE record_summary
+(
+    summary_id         BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    project_id         INT          NOT NULL,
+    is_primary         BOOLEAN      NOT NULL,
+    month              DATE         NOT NULL,
+    data_location_type VARCHAR(255) NOT NULL,
+    invenio            BOOLEAN      NOT NULL,
+    records            BIGINT       NOT NULL DEFAULT 0
+);
+CREATE INDEX record_summary_key_idx ON record_summary (project_id, is_primary, month, data_location_type, invenio);
+
+CREATE FUNCTION record_summary_apply() RETURNS TRIGGER AS
+$$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        TRUNCATE record_summary;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO record_summary (project_id, is_primary, month, data_location_type, invenio, records)
+        SELECT project_id, is_primary, month, data_location_type, invenio, -COUNT(*)
+        FROM (SELECT COALESCE(project_id_1, 0) AS project_id, TRUE AS is_primary,
+                     date_trunc('month', created)::DATE AS month, data_location_type,
+                     COALESCE(invenio, FALSE) AS invenio
+              FROM old_rows
+              UNION ALL
+              SELECT project_id_2, FALSE, date_trunc('month', created)::DATE, data_location_type,
+                     COALESCE(invenio, FALSE)
+              FROM old_rows
+              WHERE project_id_2 <> 0 AND project_id_2 IS DISTINCT FROM project_id_1) AS contributions
+        GROUP BY project_id, is_primary, month, data_location_type, invenio;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO record_summary (project_id, is_primary, month, data_location_type, invenio, records)
+        SELECT project_id, is_primary, month, data_location_type, invenio, COUNT(*)
+        FROM (SELECT COALESCE(project_id_1, 0) AS project_id, TRUE AS is_primary,
+                     date_trunc('month', created)::DATE AS month, data_location_type,
+                     COALESCE(invenio, FALSE) AS invenio
+              FROM new_rows
+              UNION ALL
+              SELECT project_id_2, FALSE, date_trunc('month', created)::DATE, data_location_type,
+                     COALESCE(invenio, FALSE)
+              FROM new_rows
+              WHERE project_id_2 <> 0 AND project_id_2 IS DISTINCT FROM project_id_1) AS contributions
+        GROUP BY project_id, is_primary, month, data_location_type, invenio;
+    END IF;
+
+    -- Now and then fold the deltas into one row per key; SKIP LOCKED leaves rows another
+    -- writer is compacting, and uncommitted deltas are not visible here, so sums are kept
+    IF random() < 0.01 THEN
+        WITH folded AS (
+            DELETE
+            FROM record_summary
+            WHERE summary_id IN (SELECT summary_id FROM record_summary FOR UPDATE SKIP LOCKED)
+            RETURNING project_id, is_primary, month, data_location_type, invenio, records)
+        INSERT
+        INTO record_summary (project_id, is_primary, month, data_location_type, invenio, records)
+        SELECT project_id, is_primary, month, data_location_type, invenio, SUM(records)
+        FROM folded
+        GROUP BY project_id, is_primary, month, data_location_type, invenio
+        HAVING SUM(records) <> 0;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow a single event per trigger
+CREATE TRIGGER record_summary_insert
+    AFTER INSERT ON Record REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_summary_apply();
+
+CREATE TRIGGER record_summary_update
+    AFTER UPDATE ON Record REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_summary_apply();
+
+CREATE TRIGGER record_summary_delete
+    AFTER DELETE ON Record REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_summary_apply();
+
+CREATE TRIGGER record_summary_truncate
+    AFTER TRUNCATE ON Record
+    FOR EACH STATEMENT EXECUTE FUNCTION record_summary_apply();
+
 CREATE TABLE Coastal6
 (
     reference_id INT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
@@ -0,0 +1,204 @@
+"""
+This module generates synthetic users, projects, assignments and records for load testing.
+
+Everything except the sequence numbers inside UIDs is derived from the seed, so two runs with
+the same seed against fresh databases produce the same catalogue. Records are loaded with
+COPY in batches, each batch getting its UIDs from a single allocation query.
+"""
+import random
+from datetime import datetime, timedelta
+
+import psycopg2.extras
+from psycopg2.extensions import connection
+from werkzeug.security import generate_password_hash
+
+from app.dao.RecordDao import Record
+
+# Creation dates fall before this fixed point so output does not depend on the clock
+SEED_ANCHOR = datetime(2024, 1, 1)
+SEED_SPAN_DAYS = 5 * 365
+SEED_PASSWORD = "password"
+
+FIRST_NAMES = ("Kai", "Leilani", "Noah", "Malia", "Keoni", "Ava", "Makana", "Mia", "Kekoa", "Emma",
+               "Ikaika", "Olivia", "Kalani", "Sofia", "Nalu", "Lucas")
+LAST_NAMES = ("Kahale", "Nakamura", "Silva", "Kealoha", "Tanaka", "Smith", "Akana", "Garcia",
+              "Fujimoto", "Kamaka", "Lee", "Medeiros")
+PLACES = ("Kihei", "Waikiki", "Hanalei", "Kailua", "Hilo", "Lahaina", "Kaanapali", "Makaha",
+          "Sunset Beach", "Waimanalo", "Kapaa", "Haleiwa", "Hanauma", "Kona")
+SUBJECTS = ("historical shoreline positions", "beach profile survey", "LiDAR elevation model",
+            "wave runup observations", "sediment grain size samples", "aerial orthomosaic",
+            "sea level rise exposure layer", "erosion rate transects", "drone imagery",
+            "coastal hazard zones", "reef bathymetry", "tide gauge record")
+FORMATS = ("table", "shapefile", "GeoTIFF", "CSV export", "NetCDF cube", "point cloud")
+PROJECT_TOPICS = ("Shoreline", "Erosion", "Sea Level", "Bathymetry", "Hazards", "Sediment",
+                  "Imagery", "Runup", "Reef", "Dunes", "Wetlands", "Harbors")
+
+# (data_location_type, weight)
+LOCATION_TYPES = (("local", 50), ("coastal6", 35), ("other", 15))
+
+
+def project_code(n):
+    """Returns the n-th two letter project code (AA, AB, ...), skipping the reserved XX."""
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWYZ"
+    return letters[n // len(letters) % len(letters)] + letters[n % len(letters)]
+
+
+def skewed_created(rng):
+    """Returns a creation date skewed towards the recent end of the span."""
+    age = SEED_SPAN_DAYS * rng.random() ** 2.5
+    return (SEED_ANCHOR - timedelta(days=age, seconds=rng.randrange(86400))).replace(microsecond=0)
+
+
+def data_location(rng, location_type, place, n):
+    """Returns a plausible data location for a location type."""
+    slug = place.lower().replace(" ", "-")
+    if location_type == "local":
+        return f"/home/crc/data/{slug}/{n:07d}.{rng.choice(('csv', 'tif', 'shp', 'nc'))}"
+    if location_type == "coastal6":
+        return f"coastal6:/volume{rng.randint(1, 4)}/{slug}/{n:07d}"
+    return f"https://example.org/datasets/{slug}/{n:07d}"
+
+
+def seed_users(db: connection, rng, count, seed):
+    """Creates count users and returns their ids."""
+    password = generate_password_hash(SEED_PASSWORD)
+    rows = []
+    for n in range(count):
+        firstname = rng.choice(FIRST_NAMES)
+        lastname = rng.choice(LAST_NAMES)
+        role = "admin" if rng.random() < 0.05 else "creator"
+        email = f"{firstname}.{lastname}.{n}.seed{seed}@example.org".lower()
+        rows.append((email, firstname, lastname, role, password, rng.random() < 0.03))
+
+    cursor = db.cursor()
+    psycopg2.extras.execute_values(
+        cursor,
+        "INSERT INTO users (email, firstname, lastname, role, password, inactive) VALUES %s"
+        " ON CONFLICT (email) DO NOTHING",
+        rows,
+        page_size=1000,
+    )
+    cursor.execute("SELECT user_id FROM users WHERE email = ANY(%s) ORDER BY user_id", ([row[0] for row in rows],))
+    db.commit()
+    return [row[0] for row in cursor.fetchall()]
+
+
+def seed_projects(db: connection, rng, count, seed):
+    """Creates count projects and returns their ids."""
+    cursor = db.cursor()
+    # project ids are assigned explicitly, as in ProjectDao.create_project
+    cursor.execute("SELECT COALESCE(MAX(project_id), 0) FROM project")
+    first_id = cursor.fetchone()[0] + 1
+    rows = []
+    for n in range(count):
+        name = f"{rng.choice(PLACES)} {rng.choice(PROJECT_TOPICS)} {n} (seed {seed})"
+        created = skewed_created(rng)
+        rows.append((first_id + n, created, name, project_code(n), rng.random() < 0.2))
+
+    psycopg2.extras.execute_values(
+        cursor,
+        "INSERT INTO project (project_id, created, project_name, code, finished) VALUES %s",
+        rows,
+        page_size=1000,
+    )
+    db.commit()
+    return [row[0] for row in rows]
+
+
+def seed_assignments(db: connection, rng, user_ids, project_ids):
+    """Assigns every user to one to four projects, favouring the first projects."""
+    weights = [1 / (rank + 1) for rank in range(len(project_ids))]
+    assignments = {}
+    for user_id in user_ids:
+        picks = rng.choices(project_ids, weights=weights, k=rng.randint(1, 4))
+        assignments[user_id] = sorted(set(picks))
+
+    cursor = db.cursor()
+    psycopg2.extras.execute_values(
+        cursor,
+        "INSERT INTO userprojects (user_id, project_id) VALUES %s ON CONFLICT DO NOTHING",
+        [(user_id, project_id) for user_id, projects in assignments.items() for project_id in projects],
+        page_size=1000,
+    )
+    db.commit()
+    return assignments
+
+
+def generate_records(rng, count, seed, assignments):
+    """Yields record_info dicts for count records."""
+    creators = list(assignments)
+    # a few prolific creators account for most records
+    creator_weights = [1 / (rank + 1) ** 0.8 for rank in range(len(creators))]
+    location_types = [location_type for location_type, _ in LOCATION_TYPES]
+    location_weights = [weight for _, weight in LOCATION_TYPES]
+
+    for n in range(count):
+        creator = rng.choices(creators, weights=creator_weights)[0]
+        projects = assignments[creator]
+        project1_id = rng.choice(projects)
+        others = [project_id for project_id in projects if project_id != project1_id]
+        project2_id = rng.choice(others) if others and rng.random() < 0.3 else 0
+        place = rng.choice(PLACES)
+        subject = rng.choice(SUBJECTS)
+        location_type = rng.choices(location_types, weights=location_weights)[0]
+        created = skewed_created(rng)
+        data_format = rng.choice(FORMATS)
+        yield {
+            "user_id": creator,
+            "record_name": f"seed{seed}-{n:07d} {place} {subject}",
+            "project1_id": project1_id,
+            "project2_id": project2_id,
+            "record_description": f"{data_format[0].upper()}{data_format[1:]} of {subject} for {place}, "
+                                  f"compiled {created:%B %d, %Y}",
+            "invenio": rng.random() < 0.3,
+            "data_location_type": location_type,
+            "data_location": data_location(rng, location_type, place, n),
+            "db_created": created,
+        }
+
+
+def seed_database(db: connection, users=50, projects=20, records=10000, seed=0, batch_size=10000, progress=None):
+    """Generates a synthetic catalogue and returns how many rows of each kind were created."""
+    rng = random.Random(seed)
+    record_dao = Record(db)
+
+    cursor = db.cursor()
+    cursor.execute("SELECT 1 FROM record WHERE record_name LIKE %s LIMIT 1", (f"seed{seed}-%",))
+    if cursor.fetchone() is not None:
+        raise ValueError(f"Records for seed {seed} already exist; reinitialise or pick another seed")
+
+    user_ids = seed_users(db, rng, users, seed)
+    project_ids = seed_projects(db, rng, projects, seed)
+    assignments = seed_assignments(db, rng, user_ids, project_ids)
+
+    created = 0
+    batch = []
+    for record_info in generate_records(rng, records, seed, assignments):
+        batch.append(record_info)
+        if len(batch) == batch_size:
+            created += copy_batch(record_dao, batch)
+            batch = []
+            if progress:
+                progress(created)
+    if batch:
+        created += copy_batch(record_dao, batch)
+        if progress:
+            progress(created)
+
+    cursor.execute("ANALYZE")
+    db.commit()
+    return {"users": len(user_ids), "projects": len(project_ids), "records": created}
+
+
+def copy_batch(record_dao: Record, batch):
+    """Allocates UIDs for and copies one batch of records."""
+    uids = record_dao.allocate_uids(
+        [(info["project1_id"], info["project2_id"], info["db_created"]) for info in batch]
+    )
+    if uids is None:
+        raise RuntimeError("Could not allocate UIDs")
+    for info, uid in zip(batch, uids):
+        info["uid"] = uid
+    if not record_dao.copy_records(batch):
+        raise RuntimeError("COPY into record failed")
+    return len(batch)
@@ -0,0 +1,202 @@
+"""
+This module keeps session data on the server, in a SQLite database in the instance folder.
+
+The cookie only carries a signed, random session id, so its size no longer depends on what
+the views store. The database runs in WAL mode and is shared by the workers on a host;
+deployments with several hosts need sticky sessions or SERVER_SESSIONS=false. Sessions
+expire PERMANENT_SESSION_LIFETIME after their last write (active sessions are extended
+once half of it has passed), expired rows are swept every SESSION_SWEEP_INTERVAL seconds,
+and a view that makes a session larger than SESSION_MAX_BYTES fails with SessionTooLarge
+when it sets the value, before its response is built. Clearing a session, as login and
+logout do, also gives it a new id. The database is created on first use, so
+commands that only build the app, such as build-assets, leave no file behind.
+"""
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask import Flask
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS session (
+    sid TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS session_expires_idx ON session (expires);
+"""
+
+
+class SessionTooLarge(Exception):
+    """Raised when a session does not fit in SESSION_MAX_BYTES."""
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session whose data is stored under sid; sid is None until it is first saved."""
+
+    def __init__(self, initial=None, sid=None, expires=None, max_bytes=None):
+        def on_update(session):
+            session.modified = True
+            session.accessed = True
+            session.check_size()
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.max_bytes = max_bytes
+        self.modified = False
+        self.accessed = False
+        self.rotate = False
+
+    def check_size(self):
+        """Raises SessionTooLarge if the session no longer fits in max_bytes."""
+        if self.max_bytes is None:
+            return
+        size = len(session_json_serializer.dumps(dict(self)))
+        if size > self.max_bytes:
+            raise SessionTooLarge(f"Session of {size} bytes exceeds SESSION_MAX_BYTES ({self.max_bytes})")
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+    def clear(self):
+        """Empties the session and gives it a new id when it is saved."""
+        super().clear()
+        self.rotate = True
+
+
+class SQLiteSessionInterface(SessionInterface):
+    """Stores sessions in a SQLite database and only their signed id in the cookie."""
+
+    serializer = session_json_serializer
+    salt = "server-session"
+
+    def __init__(self, path, max_bytes=4096, sweep_interval=300.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._local = threading.local()
+        self._last_sweep = 0.0
+
+    def connect(self):
+        """Returns this thread's connection, opening it (again, after a fork) if needed."""
+        if getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return self._local.db
+
+    def get_signer(self, app):
+        return Signer(app.secret_key, salt=self.salt)
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return ServerSession(max_bytes=self.max_bytes)
+        try:
+            sid = self.get_signer(app).unsign(cookie).decode()
+        except BadSignature:
+            return ServerSession(max_bytes=self.max_bytes)
+
+        row = self.connect().execute(
+            "SELECT data, expires FROM session WHERE sid = ? AND expires > ?", (sid, time.time())
+        ).fetchone()
+        if row is None:
+            # Never adopt an unknown id from the client; a new one is issued on save
+            return ServerSession(max_bytes=self.max_bytes)
+        return ServerSession(self.serializer.loads(row[0]), sid=sid, expires=row[1], max_bytes=self.max_bytes)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+        db = self.connect()
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if session.sid is not None and session.rotate:
+            db.execute("DELETE FROM session WHERE sid = ?", (session.sid,))
+            session.sid = None
+        if not session:
+            if session.modified:
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly
+                )
+            return
+
+        now = time.time()
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        stale = session.expires is not None and session.expires - now < lifetime / 2
+        if session.sid is not None and not session.modified and not stale:
+            return
+
+        data = self.serializer.dumps(dict(session))
+        if len(data) > self.max_bytes:
+            # Oversized writes already failed the view; only in-place changes to nested values get
+            # here, and raising now would also fail the error response, which saves this session
+            logger.error("Session of %d bytes exceeds SESSION_MAX_BYTES and was not saved", len(data))
+            return
+
+        if session.sid is None:
+            session.sid = secrets.token_urlsafe(32)
+        db.execute(
+            "INSERT INTO session (sid, data, expires) VALUES (?, ?, ?)"
+            " ON CONFLICT (sid) DO UPDATE SET data = excluded.data, expires = excluded.expires",
+            (session.sid, data, now + lifetime),
+        )
+        self.sweep(db, now)
+
+        response.set_cookie(
+            name,
+            self.get_signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite,
+        )
+
+    def sweep(self, db, now):
+        """Deletes expired sessions, at most once per sweep interval per worker."""
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        db.execute("DELETE FROM session WHERE expires <= ?", (now,))
+
+
+def init_app(app: Flask):
+    """Store sessions server-side if SERVER_SESSIONS is set."""
+    if not app.config.get("SERVER_SESSIONS"):
+        return
+    path = app.config.get("SESSION_DB_PATH") or os.path.join(app.instance_path, "sessions.sqlite3")
+    app.session_interface = SQLiteSessionInterface(
+        path, app.config["SESSION_MAX_BYTES"], app.config["SESSION_SWEEP_INTERVAL"]
+    )
@@ -0,0 +1,39 @@
+"""
+This module defines a Flask blueprint for the record statistics dashboard.
+
+Blueprint Details:
+- Blueprint Name: stats
+- URL Prefix: /stats
+- Decorators: admin_permissions (applied to all routes)
+
+Routes:
+- GET /stats/ : Display record counts per project, month, data location type and Invenio status
+
+"""
+from flask import Blueprint, render_template, request
+
+from app.auth import admin_permissions
+from app.db import get_statsdao
+from app.etag import conditional
+
+bp = Blueprint("stats", __name__, url_prefix="/stats")
+
+
+@bp.route("/")
+@admin_permissions
+@conditional("record", "project")
+def display_page():
+    """Display record statistics, for every record or for one project's."""
+    project_id = request.args.get("project", type=int)
+    stats_dao = get_statsdao()
+    projects = stats_dao.fetch_project_counts() or []
+    project = next((p for p in projects if p["project_id"] == project_id), None)
+
+    return render_template(
+        "stats/index.html",
+        project=project,
+        projects=projects,
+        totals=stats_dao.fetch_totals(project_id),
+        months=stats_dao.fetch_monthly_counts(project_id) or [],
+        location_types=stats_dao.fetch_location_type_counts(project_id) or [],
+    )
@@ -32,6 +32,7 @@ from flask import (
 
 from app.auth import admin_permissions
 from app.db import get_projectdao, get_userdao
+from app.fragments import render_fragment
 
 bp = Blueprint("user", __name__, url_prefix="/user")
 
@@ -65,7 +66,7 @@ def deactivate_user(user_id):
     """Deactivate a user."""
     get_userdao().toggle_inactive_user(user_id)
     user_info = get_userdao().fetch_user(user_id)[0]
-    return render_template("user/row.html", user_id=user_id, user=user_info)
+    return render_fragment("user/row.html", user_id=user_id, user=user_info)
 
 
 @bp.route("/create", methods=["GET", "POST"])
@@ -81,7 +82,7 @@ def create_user():
             "password": request.form["user-password"],
         }
         user_id = get_userdao().create_user(user_info)[0]
-        return render_template("user/row.html", user=user_info, user_id=user_id)
+        return render_fragment("user/row.html", user=user_info, user_id=user_id)
 
     return render_template("user/create.html")
 
@@ -108,7 +109,7 @@ def update_user(user_id):
 
     user_info["inactive"] = bool(get_userdao().check_inactive_user(user_info["email"]))
     get_userdao().update_user(user_info, user_id)
-    return render_template("user/row.html", user=user_info, user_id=user_id)
+    return render_fragment("user/row.html", user=user_info, user_id=user_id)
 
 
 @bp.route("/row/<int:user_id>")
@@ -116,7 +117,7 @@ def update_user(user_id):
 def render_row(user_id):
     """Render a single user row."""
     user = get_userdao().fetch_user(user_id)[0]
-    return render_template("user/row.html", user=user, user_id=user_id)
+    return render_fragment("user/row.html", user=user, user_id=user_id)
 
 
 @bp.route("/clear")